@@ -82,8 +82,20 @@ class Database:
         sql = f'INSERT INTO {table_name} (' + ','.join(field_names) + ') VALUES (' + ','.join(
             ["%s"] * len(values)) + ");"
         self.execute(sql, self.filter_enums(values))
+    def insert_many(self,table_name,field_names,rows)->None:
+        """
+        Insert several rows into the same table with one executemany(), rather than
+        a round trip to the server for each row
+
+        :param rows: Iterable of tuples of field values, each in the same order as field_names
+        """
+        sql = f'INSERT INTO {table_name} (' + ','.join(field_names) + ') VALUES (' + ','.join(
+            ["%s"] * len(field_names)) + ");"
+        self.executemany(sql, [self.filter_enums(values) for values in rows])
     def execute(self,*args,**kwargs):
         return self._cur.execute(*args,**kwargs)
+    def executemany(self,*args,**kwargs):
+        return self._cur.executemany(*args,**kwargs)
     def filter_enums(self,values):
         """
         Do whatever is necessary to reformat data for the connection. A good (like psycopg3) connection
@@ -55,10 +55,15 @@ class MysqlDatabase(Database):
         psql_type="ENUM('"+"','".join([member_name for member_name,member in field_type.__members__.items()])+"')"
         return [],psql_type,[]
     def execute(self,*args,**kwargs):
+        self.profiled(self._cur.execute,*args,**kwargs)
+    def executemany(self,*args,**kwargs):
+        self.profiled(self._cur.executemany,*args,**kwargs)
+    def profiled(self,method,*args,**kwargs):
+        # Time a cursor call, keyed on the SQL string
         if args[0] not in self.profile:
             self.profile[args[0]]=[0,timedelta(), []]
         t0=datetime.now()
-        self._cur.execute(*args,**kwargs)
+        method(*args,**kwargs)
         t1=datetime.now()
         dt=t1-t0
         self.profile[args[0]][0]+=1
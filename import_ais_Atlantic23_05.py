@@ -3,9 +3,14 @@ Import AIS messages from the record of Atlantic23.05
 """
 import bz2
 import gzip
+import io
+import os
+import queue
 import re
+import threading
 import warnings
 
+from contextlib import closing
 from datetime import datetime
 from glob import glob
 from math import floor
@@ -22,11 +27,37 @@ from packet.ais import parse_payload, parse_aivdm, msg4, NotHandled, ensure_tabl
 
 def smart_open(fn, mode: str = None):
     if ".bz2" in fn:
-        return bz2.open(fn, mode)
+        try:
+            # Decompresses bzip2 blocks in parallel on all cores, if available
+            from indexed_bzip2 import IndexedBzip2File
+        except ImportError:
+            return bz2.open(fn, mode)
+        inf=IndexedBzip2File(fn, parallelization=os.cpu_count())
+        return io.TextIOWrapper(inf) if mode is not None and "t" in mode else inf
     elif ".gz" in fn:
         return gzip.open(fn, mode)
+    elif ".zst" in fn:
+        # zstandard is only needed if the logs have been recompressed with recompress_zst()
+        import zstandard
+        return zstandard.open(fn, mode)
     else:
-        return open(fn, mode)
+        return open(fn, mode, buffering=1<<20)
+
+
+def recompress_zst(fn:str,level:int=9)->str:
+    """
+    Recompress a .bz2 log as .zst, which decompresses several times faster.
+    The original file is left in place.
+
+    :param fn: Filename of a bzip2-compressed log, ending in .bz2
+    :param level: zstd compression level
+    :return: Filename of the zstd-compressed log
+    """
+    import zstandard
+    outfn=fn[:-len(".bz2")]+".zst"
+    with bz2.open(fn,"rb") as inf, open(outfn,"wb") as ouf:
+        zstandard.ZstdCompressor(level=level,threads=-1).copy_stream(inf,ouf)
+    return outfn
 
 
 def make_utc(y:int=None,
@@ -95,7 +126,7 @@ def make_utc(y:int=None,
 
 
 ttycat_fn_timestamp=re.compile(r"daisy_(?P<year>[0-9][0-9])(?P<month>[0-9][0-9])(?P<day>[0-9][0-9])"
-                                "_(?P<hour>[0-9][0-9])(?P<minute>[0-9][0-9])(?P<second>[0-9][0-9]).nmea(.bz2)?")
+                                "_(?P<hour>[0-9][0-9])(?P<minute>[0-9][0-9])(?P<second>[0-9][0-9]).nmea(.bz2|.zst)?")
 putty_fn_timestamp =re.compile(r"daisy(?P<year>[0-9][0-9][0-9][0-9])-(?P<month>[0-9][0-9])-(?P<day>[0-9][0-9])"
                                 "T(?P<hour>[0-9][0-9])(?P<minute>[0-9][0-9])(?P<second>[0-9][0-9]).log")
 def get_fn_dt(infn,file=None):
@@ -124,6 +155,74 @@ def line_iterator(inf):
         yield line.strip()
 
 
+def threaded_line_iterator(infn, block_size:int=1<<20, max_chunks:int=16):
+    """
+    Read lines from a log on a background thread, so that reading and decompressing
+    the file overlaps with parsing on the calling thread. The bz2, gzip, and zstd
+    decompressors all release the GIL while they work.
+
+    :param infn: Filename of log, opened with smart_open()
+    :param block_size: Number of bytes read from the file at once. The lines in each
+                       block are handed across to the calling thread together.
+    :param max_chunks: Maximum number of blocks read ahead of the calling thread
+    :yield: Tuple of:
+      * offset in the (decompressed) file of the start of the line
+      * line with whitespace stripped from both ends
+
+    The file is read in binary, and split into lines by bytes.splitlines(), which
+    splits on the same CR, LF, and CRLF as text mode. Offsets are counted from the
+    line lengths, rather than asking the text layer for tell() after every line.
+    Lines are decoded as Latin-1, which is the same as ASCII for AIS logs, but
+    can't fail on a corrupted byte.
+    """
+    chunks=queue.Queue(maxsize=max_chunks)
+    stop=threading.Event()
+    def put(item)->bool:
+        # Give up if the consumer has gone away, rather than blocking forever on a full queue
+        while not stop.is_set():
+            try:
+                chunks.put(item,timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    def reader():
+        try:
+            with smart_open(infn, "rb") as inf:
+                ofs=0
+                rest=b""
+                while True:
+                    block=inf.read(block_size)
+                    if block:
+                        lines=(rest+block).splitlines(keepends=True)
+                        # Last line may be continued in the next block. This includes a CR
+                        # which might be the first half of a CRLF.
+                        rest=lines.pop() if not lines[-1].endswith(b"\n") else b""
+                    else:
+                        lines=[rest] if rest else []
+                    chunk=[]
+                    for line in lines:
+                        chunk.append((ofs,line.decode('latin-1').strip()))
+                        ofs+=len(line)
+                    if chunk and not put(chunk):
+                        return
+                    if not block:
+                        break
+            put(None)
+        except Exception as e:
+            put(e)
+    thread=threading.Thread(target=reader,name=f"reader {basename(infn)}",daemon=True)
+    thread.start()
+    try:
+        while (chunk:=chunks.get()) is not None:
+            if isinstance(chunk,Exception):
+                raise chunk
+            yield from chunk
+    finally:
+        stop.set()
+        thread.join()
+
+
 puttylog = re.compile(
     r"=~=~=~=~=~=~=~=~=~=~=~= PuTTY log "
     r"(?P<year>[0-9][0-9][0-9][0-9])."
@@ -140,29 +239,51 @@ line_timestamp = re.compile(
     r"(?P<minute>[0-9][0-9]):"
     r"(?P<second>[0-9][0-9])\s*"
     r"(?P<line>.*)")
+
+
+def split_line_timestamp(line:str):
+    """
+    Split the received timestamp off the front of a line. This does the same
+    thing as line_timestamp, but since the timestamp is fixed-width, it can
+    pick the fields out by position instead of running a regular expression
+    on every line.
+
+    :param line: Line from the log, with or without a timestamp
+    :return: Tuple of:
+      * Timestamp as a UTC datetime, or None if the line doesn't start with a timestamp
+      * Rest of the line after the timestamp and any whitespace, or the whole line if no timestamp
+    """
+    ts=line[:19]
+    if len(ts)<19 or ts[4]!='-' or ts[7]!='-' or ts[10]!='T' or ts[13]!=':' or ts[16]!=':':
+        return None,line
+    y,m,d,h,n,s=ts[0:4],ts[5:7],ts[8:10],ts[11:13],ts[14:16],ts[17:19]
+    digits=y+m+d+h+n+s
+    if not (digits.isascii() and digits.isdigit()):
+        return None,line
+    return make_utc(y,m,d,h,n,s),line[19:].lstrip()
+
+
 debug_start = re.compile("dAISy v5\.13 - dAISy 2\+ \(5503\) \(C\)2014-2021 Adrian Studer")
 debug_end = re.compile("> entering AIS receive mode")
+# radioline and errorline are used with search(), so they don't need a leading .*
 radioline = re.compile(
-    r".*R?adio(?P<radio>[0-9])\s+"
+    r"R?adio(?P<radio>[0-9])\s+"
     r"Channel=(?P<channel>[AB])\s+"
     r"RSSI=(?P<rssi>-?[0-9]+)dBm\s+"
     r"MsgType=(?P<msgtype>[0-9]+)(\s+MMSI=(?P<mmsi>[0-9]+))?.*")
-errorline = re.compile(r".*error:\s+(?P<error>.*)")
+errorline = re.compile(r"error:\s+(?P<error>.*)")
 
 
 def packet_iterator(infn):
+    binfn=basename(infn)
     marker=''
     in_debug = False
-    this_ofs = 0
-    next_ofs = this_ofs
-    with smart_open(infn, "rt") as inf:
-        for i_line,line in enumerate(line_iterator(inf)):
+    with closing(threaded_line_iterator(infn)) as lines:
+        for i_line,(this_ofs,line) in enumerate(lines):
             print(marker, end='')
             if i_line % 200 == 0:
                 print(i_line)
             marker = '.'
-            this_ofs = next_ofs
-            next_ofs = inf.tell()
             original_line = None
             # Time that a message was received. On Atlantic23.05, AIS data was recorded
             # on the laptop. The laptop was connected by wired ethernet to Fluttershy and
@@ -179,11 +300,10 @@ def packet_iterator(infn):
             #
             # Also, ttycatnet.c wasn't used until later in the voyage, starting at
             # 2023-05-09T04:23:13 UTC
-            received_dt = None
-            if time_match := line_timestamp.match(line):
+            received_dt, rest = split_line_timestamp(line)
+            if received_dt is not None:
                 original_line = line
-                received_dt = make_utc(match=time_match)
-                line = time_match.group("line")
+                line = rest
                 marker = '+'
             if len(line) < 2:
                 # Just skip over blank lines
@@ -192,31 +312,14 @@ def packet_iterator(infn):
                 in_debug = False
                 continue
             if not in_debug:
-                if debug_start.match(line):
-                    in_debug = True
-                    continue
-                if putty_match := puttylog.match(line):
-                    # Putty log header -- these are done in local time which
-                    # was always America/Denver during Atlantic23.05
-                    line_dt = make_utc(match=putty_match, local=True)
-                    continue
-                if radio_match := radioline.match(line):
-                    radio = {"radio_" + k: (l(radio_match.group(k)) if (radio_match.group(k) is not None) else None) for
-                             k, l in
-                             [("radio", int), ("channel", str), ("rssi", int), ("msgtype", int),
-                              ("mmsi", int)]}
-                    marker = '-'
-                    continue
-                if error_match := errorline.match(line):
-                    marker = "V"
-                    # warnings.warn(f"dAISy-detected error: {basename(infn)}, {i_line=} {line_dt=}\n{line}")
-                    continue
+                # Nearly every line outside the debug block is an AIVDM message, so check
+                # for that with a string comparison before trying any of the regexes.
                 if line[0] == "!" or line[0:5] == "AIVDM":
                     try:
                         payload, cksum = line.split("*")
                     except ValueError:
                         marker = "W"
-                        # warnings.warn(f"Unable to split checksum: {basename(infn)}, {i_line=}\n{line}")
+                        # warnings.warn(f"Unable to split checksum: {binfn}, {i_line=}\n{line}")
                         continue
                     try:
                         msg = parse_aivdm(payload)
@@ -227,14 +330,32 @@ def packet_iterator(infn):
                             yield msg,this_ofs
                     except NotHandled:
                         marker = "X"
-                        warnings.warn(f"Unable to parse message: {basename(infn)}, {i_line=}\n{line}\ndue to")
+                        warnings.warn(f"Unable to parse message: {binfn}, {i_line=}\n{line}\ndue to")
                         import traceback
                         traceback.print_exc()
-                        continue
-                else:
-                    marker = "Y"
-                    warnings.warn(f"Unrecognized line in file: {basename(infn)}, {i_line=}\n{original_line=}\n{line=}")
                     continue
+                if debug_start.match(line):
+                    in_debug = True
+                    continue
+                if putty_match := puttylog.match(line):
+                    # Putty log header -- these are done in local time which
+                    # was always America/Denver during Atlantic23.05
+                    line_dt = make_utc(match=putty_match, local=True)
+                    continue
+                if radio_match := radioline.search(line):
+                    radio = {"radio_" + k: (l(radio_match.group(k)) if (radio_match.group(k) is not None) else None) for
+                             k, l in
+                             [("radio", int), ("channel", str), ("rssi", int), ("msgtype", int),
+                              ("mmsi", int)]}
+                    marker = '-'
+                    continue
+                if error_match := errorline.search(line):
+                    marker = "V"
+                    # warnings.warn(f"dAISy-detected error: {binfn}, {i_line=} {line_dt=}\n{line}")
+                    continue
+                marker = "Y"
+                warnings.warn(f"Unrecognized line in file: {binfn}, {i_line=}\n{original_line=}\n{line=}")
+                continue
 
 
 def main():
@@ -244,7 +365,6 @@ def main():
     drop=True
     last_msg4_dt=None
     seen_msg4_mmsi=set()
-    aivdm=re.compile(r".*(!AIVDM.*)(\*[A-F0-9][A-F0-9])")
     transmitted_tl={} #transmitted time expressed as a list of (y,m,d,h,n,s)
     with PostgresDatabase(host="192.168.217.102",port=5432,
                           user="globetrotter", password="globetrotter", database="globetrotter",
@@ -255,11 +375,12 @@ def main():
                 ensure_tables(db,drop=drop)
             infns = sorted(glob("/mnt/big/kwanometry/Atlantic23.05/daisy/2023/05/*/*",recursive=True))
             for i_infn,infn in enumerate(infns):
+                binfn=basename(infn)
                 file_dt = get_fn_dt(infn)
                 last_believed_xmit_dt=file_dt
-                print(f"{i_infn}/{len(infns)} {basename(infn)}")
+                print(f"{i_infn}/{len(infns)} {binfn}")
                 with db.transaction():
-                    fileid = register_file_start(db, basename(infn))
+                    fileid = register_file_start(db, binfn)
                 with db.transaction():
                     for msg,ofs in packet_iterator(infn):
                         # Timing
@@ -354,13 +475,15 @@ def main():
                             if x is None:
                                 has_time=False
                         if has_time:
-                            if msg.mmsi in transmitted_tl:
+                            # Time lists are in most-significant-first order, so they compare
+                            # in the same order as the times they represent. Only make datetimes
+                            # for the warning when the times actually went backwards.
+                            if msg.mmsi in transmitted_tl and this_transmitted_tl < transmitted_tl[msg.mmsi]:
                                 old_transmitted_dt = make_utc(*transmitted_tl[msg.mmsi])
                                 new_transmitted_dt = make_utc(*this_transmitted_tl)
-                                if new_transmitted_dt < old_transmitted_dt:
-                                    print(f"Timestamps on mmsi {msg.mmsi:09d} went backwards. "
-                                          f"Old={str(old_transmitted_dt)}, "
-                                          f"new={str(new_transmitted_dt)}")
+                                print(f"Timestamps on mmsi {msg.mmsi:09d} went backwards. "
+                                      f"Old={str(old_transmitted_dt)}, "
+                                      f"new={str(new_transmitted_dt)}")
                             try:
                                 msg.utc_xmit=datetime(*this_transmitted_tl)
                             except ValueError:
@@ -372,7 +495,7 @@ def main():
                         msg.write(db, fileid=fileid, ofs=ofs)
                 with db.transaction():
                     register_file_finish(db, fileid)
-                print(f"\nDone with {basename(infn)} {i_infn}/{len(infns)}")
+                print(f"\nDone with {binfn} {i_infn}/{len(infns)}")
 
 
 if __name__=="__main__":
@@ -38,12 +38,11 @@ def handle_packet(db:Database, fileid:int, ofs:int, packet:'Packet')->None:
     :param packet:
     :return:
     """
-    packet.fileid=fileid
-    packet.ofs=ofs
     if packet.use_epoch:
         if not hasattr(handle_packet,'epoch_packets'):
             handle_packet.epoch_packets=[]
-        handle_packet.epoch_packets.append(packet)
+        # Packet classes have __slots__, so keep the file and offset alongside the packet rather than on it
+        handle_packet.epoch_packets.append((packet,fileid,ofs))
     else:
         if type(packet)!=UBX_ESF_MEAS:
             packet.write(db,fileid=fileid,ofs=ofs)
@@ -62,20 +61,25 @@ def handle_packet(db:Database, fileid:int, ofs:int, packet:'Packet')->None:
             epochid,pre_exist=register_epoch(db,utc=handle_packet.utc, iTOW=handle_packet.iTOW, week=handle_packet.week)
             if not pre_exist:
                 write_epoch=True
-                for epoch_packet in handle_packet.epoch_packets:
+                for epoch_packet,_,_ in handle_packet.epoch_packets:
                     if hasattr(epoch_packet,'iTOW') and handle_packet.iTOW!=epoch_packet.iTOW:
                         warnings.warn(f"Packet has iTOW that doesn't match epoch: Expected {handle_packet.iTOW}, "
                                       f"saw {epoch_packet.iTOW}, packet type {packet.__class__.__name__}")
                         write_epoch=False
                 if write_epoch:
-                    for epoch_packet in handle_packet.epoch_packets:
-                        epoch_packet.write(db,epochid=epochid,fileid=epoch_packet.fileid,ofs=epoch_packet.ofs)
+                    for epoch_packet,epoch_fileid,epoch_ofs in handle_packet.epoch_packets:
+                        epoch_packet.write(db,epochid=epochid,fileid=epoch_fileid,ofs=epoch_ofs)
         else:
             print("Incomplete epoch")
+        for epoch_packet,_,_ in handle_packet.epoch_packets:
+            epoch_packet.release()
         handle_packet.epoch_packets=[]
         handle_packet.utc =None
         handle_packet.iTOW=None
         handle_packet.week=None
+    # Epoch packets are released above, once their epoch is written
+    if not packet.use_epoch:
+        packet.release()
 
 
 def plot_height(db):
@@ -12,6 +12,8 @@ from database import Database, Field
 
 
 class Packet:
+    # Empty, so that subclasses which declare __slots__ don't get a __dict__ anyway
+    __slots__=()
     class CacheHasOldValue(Enum):
         NO_PREV=0
         PREV_SAME=1
@@ -35,10 +37,17 @@ class Packet:
             if old_value!=new_value:
                 return self.CacheHasOldValue.PREV_DIFF
         return self.CacheHasOldValue.PREV_SAME
+    def parent_values(self)->list:
+        """
+        Get the values of the fields that go in the parent table, in the same
+        order as compiled_form.hq+compiled_form.fq. Packet classes may replace
+        this with a version specialized for their fields.
+        """
+        return [getattr(self,field_name) for field_name in self.compiled_form.hq+self.compiled_form.fq]
     def write(self,db,*,fileid:int,ofs:int,epochid:int=None)->None:
         table_name = self.get_table_name()
         parent_fields=self.compiled_form.hq+self.compiled_form.fq
-        values=[getattr(self,field_name) for field_name in parent_fields]+[fileid,ofs]
+        values=self.parent_values()+[fileid,ofs]
         parent_fields+=["file","ofs"]
         if self.has_cache:
             changed=self.cache_has_old_value(db)
@@ -53,11 +62,12 @@ class Packet:
             parent_fields+=["epoch"]
             values.append(epochid)
         parent=db.insert_get_id(table_name,parent_fields,values)
-        if self.compiled_form.bf is not None and len(self.compiled_form.bq)>0:
+        if len(self.compiled_form.bq)>0:
             columns=tuple([getattr(self,field_name) for field_name in self.compiled_form.bq])
             block_field_names=["parent",]+self.compiled_form.bq
-            for values in zip(*columns):
-                db.insert(table_name+"_block",block_field_names,(parent,)+values)
+            rows=[(parent,)+values for values in zip(*columns)]
+            if len(rows)>0:
+                db.insert_many(table_name+"_block",block_field_names,rows)
 
     def get_table_name(self):
         table_name = getattr(self, 'table_name', self.__class__.__name__[4:].lower())
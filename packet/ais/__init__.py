@@ -71,23 +71,25 @@ after the changeover to record reception times.
 import bz2
 import re
 import warnings
+from base64 import b64encode
 from collections import namedtuple
-from dataclasses import dataclass, field, fields
+from dataclasses import MISSING, dataclass, field, fields
 from datetime import datetime, timedelta
 from enum import Enum
+from functools import lru_cache
 from glob import glob
 from math import sqrt
 from os.path import basename
-from typing import Callable, Any
+from typing import Callable, Any, TYPE_CHECKING
 
-from database import Database
 from packet import Packet, ensure_table
+from packet.bin import signed_vec
 
-import pytest as pytest
+import numpy as np
 import pytz
-from matplotlib import pyplot as plt
 
-from track import Track
+if TYPE_CHECKING:
+    from database import Database
 
 class NotHandled(Exception):
     pass
@@ -105,11 +107,19 @@ def wraparound_delta(a:int,b:int,limit:int):
     :param limit:
     :return:
     """
-    if(b<a):
-      result=limit+b-a
-    else:
-      result=b-a
-    return result
+    return (b-a)%limit
+
+
+def wraparound_delta_vec(a:np.ndarray,b:np.ndarray,limit:int)->np.ndarray:
+    """
+    Same as wraparound_delta(), but on whole arrays of clock readings at once
+
+    :param a: Array of earlier clock readings
+    :param b: Array of later clock readings, same shape as a (or broadcastable to it)
+    :param limit: Clock rollover
+    :return: Array of number of ticks from each a to the matching b
+    """
+    return (b-a)%limit
 
 
 
@@ -124,30 +134,67 @@ def dearmor_payload(payload,shift=0):
        number of bits in payload
        de-armored payload in an int. This int is likely to be hundreds of bits long.
     """
-    def dearmor_char(c):
-        """
-        Given a character, return the 6-byte integer it encodes
+    # Each character encodes 6 bits. To recover the bits, convert the character to
+    # its ASCII code point. Then subtract 48, and if the answer is greater than 40,
+    # subtract 8 more. Six bits are exactly two octal digits, so translate each
+    # character to its two digits and let int() build the whole payload at once,
+    # instead of growing the int by 6 bits at a time.
+    if len(payload)==0:
+        return -shift,0
+    result=int(payload.translate(_DEARMOR_OCT_TBL),8)>>shift
+    return len(payload)*6-shift,result
 
-        :param c:
-        :return:
 
-        Each character encodes a 6-byte character. To recover the bits,
-        convert the character to its ASCII code point. Then subtract 48,
-        and if the answer is greater than 40, subtract 8 more.
-        """
-        a=ord(c)
-        a=a-48
-        if a>40:
-            a=a-8
-        return a
-    nbits=0
-    result=0
-    for c in payload:
-        result=result*64+dearmor_char(c)
-        nbits+=6
-    result//=2**shift
-    nbits-=shift
-    return nbits,result
+# Translation table from ASCII code point to the two octal digits of the 6-bit value it encodes
+_DEARMOR_OCT_TBL={c:format(((c-48)-8 if (c-48)>40 else (c-48)) & 0x3F,'02o') for c in range(256)}
+
+
+# Lookup table from ASCII code point to the 6-bit value it encodes, for use with np.take().
+# Code points outside the armor alphabet map to whatever the arithmetic gives, masked to 6 bits.
+_DEARMOR_TBL_ARR=np.array([((c-48)-8 if (c-48)>40 else (c-48)) & 0x3F for c in range(256)],dtype=np.uint8)
+
+
+def dearmor_batch(payloads,nchars:int)->np.ndarray:
+    """
+    Remove the ASCII armor from many payloads at once
+
+    :param payloads: Sequence of armored payloads, each a str or bytes
+    :param nchars: Number of characters to use from each payload. Shorter
+                   payloads are padded with '0', which is armor for zero bits.
+                   Should be a multiple of 4 so that the result is a whole number of bytes.
+    :return: uint8 array of shape (len(payloads),nchars*6//8) with the de-armored bits
+             of each payload packed MSB first, one payload per row.
+    """
+    # latin-1 maps every byte to itself, so a corrupted high byte in one payload just
+    # dearmors to garbage bits like any other invalid armor character, rather than
+    # raising and losing the whole batch. The table covers all 256 codes.
+    joined="".join([(p if isinstance(p,str) else str(p,encoding='latin-1'))[:nchars].ljust(nchars,'0') for p in payloads])
+    ascii_codes=np.frombuffer(joined.encode('latin-1'),dtype=np.uint8).reshape(-1,nchars//4,4)
+    codes=np.take(_DEARMOR_TBL_ARR,ascii_codes)
+    packed=np.empty(codes.shape[:2]+(3,),dtype=np.uint8)
+    # Four 6-bit codes make three bytes
+    packed[:,:,0]=(codes[:,:,0]<<2)|(codes[:,:,1]>>4)
+    packed[:,:,1]=((codes[:,:,1]&0x0F)<<4)|(codes[:,:,2]>>2)
+    packed[:,:,2]=((codes[:,:,2]&0x03)<<6)|codes[:,:,3]
+    return packed.reshape(len(payloads),-1)
+
+
+def get_bitfield_batch(packed:np.ndarray,startbit:int,field_nbits:int)->np.ndarray:
+    """
+    Get the same bitfield from many payloads at once
+
+    :param packed: uint8 array from dearmor_batch(), one payload per row
+    :param startbit: Start bit of field to extract, numbered such that MSB=0
+    :param field_nbits: Number of bits in the field to extract, no more than 57
+    :return: uint64 array with the extracted bitfield from each row
+    """
+    byte0=startbit//8
+    byte1=(startbit+field_nbits-1)//8
+    result=np.zeros(packed.shape[0],dtype=np.uint64)
+    for i_byte in range(byte0,byte1+1):
+        result=(result<<np.uint64(8))|packed[:,i_byte]
+    result>>=np.uint64(8*(byte1+1)-(startbit+field_nbits))
+    return result & np.uint64((1<<field_nbits)-1)
 
 
 def get_bitfield(nbits,payload,startbit,field_nbits):
@@ -166,8 +213,8 @@ def get_bitfield(nbits,payload,startbit,field_nbits):
     # 0123456789 (MSB numbering from documentation)
     # xxXXxxxxxx
     # 9876543210 (LSB numbering for bit manipulation)
-    #The mask is 2 bits wide, so 2**field_nbits-1=2**2-1
-    mask=2**field_nbits-1
+    #The mask is 2 bits wide, so (1<<field_nbits)-1=(1<<2)-1
+    mask=(1<<field_nbits)-1
     #the mask needs to be shifted so that its lowest bit is at LSB 6. This is from the
     #bit length(10) minus the highest bit position in MSB(2) minus the bit width(2)
     shift=nbits-startbit-field_nbits
@@ -178,38 +225,45 @@ def get_bitfield(nbits,payload,startbit,field_nbits):
         # Partial field, append enough zeros to fill out the field, and correct the shift
         payload=payload<<-shift
         shift=0
-    shifted_mask=mask<<shift
-    #Now we can grab the field and shift it back down
-    field=(payload & shifted_mask)>>shift
+    #Now we can shift the field down and grab it
+    field=(payload>>shift) & mask
     return field
 
 
+# 6-bit text alphabet, indexed by the 6-bit value
+#                         1         2         3                4         5         6
+#               0123456789012345678901234567890123   4    56789012345678901234567890123
+_SIXBIT_CHARS=r"@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\]^_ !"+'"'+r"#$%&'()*+,-./0123456789:;<=>?"
+# Translation from standard base64 alphabet to 6-bit text. Both encode 6 bits per character,
+# so base64-encoding the bits and translating the result decodes the whole string in C.
+_B64_TO_SIXBIT=str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/",_SIXBIT_CHARS)
+
+
 def sixbit(nbits,string):
-          #           1         2         3                4         5         6
-          # 0123456789012345678901234567890123   4    56789012345678901234567890123
-    chars=r"@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\]^_ !"+'"'+r"#$%&'()*+,-./0123456789:;<=>?"
-    result=""
-    for i in range(nbits//6):
-        char=get_bitfield(nbits,string,i*6,6)
-        if char==0:
-            return result.strip()
-        result+=chars[char]
+    nchars=nbits//6
+    # Drop any bits at the end that don't make a whole character, then pad with
+    # zero characters to a whole number of 3-byte base64 groups
+    pad=-nchars%4
+    val=(string>>(nbits-nchars*6))<<(pad*6)
+    result=b64encode(val.to_bytes((nchars+pad)*3//4,'big')).decode('ascii')[:nchars].translate(_B64_TO_SIXBIT)
+    # Text ends at the first @ (zero)
+    end=result.find('@')
+    if end>=0:
+        result=result[:end]
     return result.strip()
 
 
-def signed(nbits,val):
-    signbit=get_bitfield(nbits,val,0,1)
-    if signbit:
-        val=val-2**nbits
-    return val
+@lru_cache(maxsize=4096)
+def sixbit_cached(nbits,string):
+    """
+    Same as sixbit(), but remembers recent results. Use this for names and callsigns,
+    which are sent over and over by the same ship.
+    """
+    return sixbit(nbits,string)
 
 
-@pytest.mark.parametrize(
-    "nbits,val,exp",
-    [(32,0xffffffff,-1)]
-)
-def exercise_signed(nbits,val,exp):
-    assert signed(nbits,val)==exp
+def signed(nbits,val):
+    return val-(1<<nbits) if val>>(nbits-1) else val
 
 
 def u(nbits,payload):
@@ -221,6 +275,7 @@ def b(nbits,payload):
 
 
 t=sixbit
+tc=sixbit_cached
 
 
 class Status(Enum):
@@ -269,8 +324,12 @@ class EPFD(Enum):
 
 def parse_aivdm(msg):
     if not hasattr(parse_aivdm,'frags'):
-        # Dictionary of lists of fragments. Key is fragid, value is list of payloads. Once all payloads
-        # are collected, they are concatenated and parsed, then removed from dict.
+        # Dictionary of partially-received messages. Key is fragid, value is a list of
+        #  * list of payloads, indexed by fragment number
+        #  * bitmask of fragments received so far, bit 0 is fragment 1
+        #  * bitmask with all fragments received
+        #  * number of fill bits, from the final fragment
+        # Once all payloads are collected, they are concatenated and parsed, then removed from dict.
         parse_aivdm.frags={}
     parts=msg.split(",")
     nfrag=int(parts[1])
@@ -280,17 +339,20 @@ def parse_aivdm(msg):
     bitsleft=int(parts[6])
     if nfrag>1:
         fragid=int(parts[3])
-        if fragid not in parse_aivdm.frags:
-            parse_aivdm.frags[fragid]=[None]*nfrag
-        parse_aivdm.frags[fragid][ifrag-1]=payload
-        if ifrag<nfrag:
-            assert bitsleft==0,"Nonzero number of bits left in nonfinal fragment"
-        if None not in parse_aivdm.frags[fragid]:
-            #concatenate payloads
-            payload="".join(parse_aivdm.frags[fragid])
+        entry=parse_aivdm.frags.get(fragid)
+        if entry is None:
+            entry=[[""]*nfrag,0,(1<<nfrag)-1,0]
+            parse_aivdm.frags[fragid]=entry
+        entry[0][ifrag-1]=payload
+        entry[1]|=1<<(ifrag-1)
+        if ifrag==nfrag:
+            # Only the final fragment may have fill bits
+            entry[3]=bitsleft
+        if entry[1]==entry[2]:
             #now remove frags from dict
             del parse_aivdm.frags[fragid]
-            return parse_payload(payload,bitsleft)
+            #concatenate payloads
+            return parse_payload("".join(entry[0]),entry[3])
         else:
             return None
     else:
@@ -300,24 +362,35 @@ def parse_aivdm(msg):
 def parse_payload(payload, shift=0):
     nbits, payload = dearmor_payload(payload, shift)
     msgtype = get_bitfield(nbits, payload, 0, 6)
+    if msgtype==0:
+        return None
+    msgcls = None if msgtype is None else parse_payload.classes[msgtype]
     if msgtype == 24:
         partno = get_bitfield(nbits, payload, 38, 2)
         msgtype = ("24a" if partno == 0 else "24b")
-    if msgtype==6:
+        msgcls = parse_payload.subclasses.get(msgtype)
+    elif msgtype==6:
         dac = get_bitfield(nbits, payload, 72, 10)
         fid = get_bitfield(nbits, payload, 82, 6)
         msgtype=(6,dac,fid)
-        if msgtype not in parse_payload.classes:
+        msgcls = parse_payload.subclasses.get(msgtype)
+        if msgcls is None:
             warnings.warn(f"Unhandled type 6 subtype {dac=}, {fid=}")
             msgtype=6
-    if msgtype==0:
-        return None
-    if msgtype not in parse_payload.classes:
+            msgcls = parse_payload.classes[6]
+    if msgcls is None:
         raise NotHandled(f"No handler for message type {msgtype}\n{payload:x}")
-    return parse_payload.classes[msgtype](nbits,payload)
-parse_payload.classes={}
+    return msgcls(nbits,payload)
+# Message classes for plain integer message types, indexed by message type
+parse_payload.classes=[None]*64
+# Message classes for message types which are split further by a field in the message,
+# keyed by "24a"/"24b" or (6,dac,fid)
+parse_payload.subclasses={}
 def register_msg(msgtype,msgcls):
-    parse_payload.classes[msgtype]=msgcls
+    if isinstance(msgtype,int):
+        parse_payload.classes[msgtype]=msgcls
+    else:
+        parse_payload.subclasses[msgtype]=msgcls
     if type(msgtype)==tuple:
         msgcls.table_name=f'ais_{"_".join([str(x) for x in msgtype])}'
     else:
@@ -325,11 +398,18 @@ def register_msg(msgtype,msgcls):
 
 
 def e(cls):
+    """
+    Make a scale function which converts a raw field to a member of an Enum
+
+    :param cls: Enum class, with integer values
+    :return: Scale function which returns the member of cls with the raw value, or None
+             if there is no such member. The members are looked up in a tuple indexed
+             by value, built once here, rather than calling cls() for each field.
+    """
+    vals={m.value:m for m in cls}
+    tbl=tuple(vals.get(i) for i in range(max(vals)+1))
     def inner(n,payload):
-        try:
-            return cls(payload)
-        except ValueError:
-            return None
+        return tbl[payload] if payload<len(tbl) else None
     return inner
 
 
@@ -379,7 +459,29 @@ def aismsg(msgcls):
         pktcls.has_cache=False
         pktcls.cache_index = None
         pktcls.cache_fields = []
+        # Everything needed to pull each field out of the payload, worked out once here
+        # rather than looked up in the metadata for every message. Each entry is a tuple of
+        #  * field name
+        #  * start bit, MSB=0
+        #  * number of bits
+        #  * mask of that many bits
+        #  * raw value meaning "not available", or None
+        #  * scale function
+        pktcls.bit_fields = []
+        # Fields not decoded from the payload, and their defaults. The class has
+        # __slots__, so these must be set by __init__ rather than falling back to
+        # a class attribute.
+        pktcls.default_fields = []
         for field in fields(pktcls):
+            if "b0" in field.metadata:
+                nb=field.metadata["nb"]
+                pktcls.bit_fields.append((field.name,field.metadata["b0"],nb,(1<<nb)-1,
+                                          field.metadata.get("nan",None),field.metadata["scale"]))
+            else:
+                if field.default is MISSING:
+                    # Includes default_factory, which __init__ would have to call for every message
+                    raise ValueError(f"{pktcls.__name__}.{field.name} is not decoded from the payload, so it needs a default value")
+                pktcls.default_fields.append((field.name,field.default))
             if field.metadata.get('record', True):
                 record_names.append(field.name)
             if field.metadata.get('cache', False):
@@ -409,14 +511,62 @@ def aismsg(msgcls):
              footer_fields, footer_types, footer_scale, footer_units, footer_format, footer_widths, footer_b0,
              footer_b1, footer_unpack, footer_records))
 
+    def codegen(pktcls: dataclass) -> None:
+        """
+        Generate a specialized __init__ for a message class, with the bit position,
+        mask, and scale of each field written into the code as constants. This
+        runs once per class, and the generated code is a straight line of shifts
+        and masks with no loop over fields() and no metadata lookups.
+
+        The generated code only handles payloads long enough to contain all fields.
+        Shorter payloads (truncated or variable-length messages) go through the
+        general __init__ above, which handles partial and missing fields.
+        """
+        ns={"init_general":__init__}
+        lines=["def __init__(self, nbits:int, payload:int):"]
+        end=max([b0+nb for _,b0,nb,_,_,_ in pktcls.bit_fields])
+        lines.append(f"    if nbits<{end}:")
+        lines.append(f"        init_general(self,nbits,payload)")
+        lines.append(f"        return")
+        for name,default in pktcls.default_fields:
+            ns[f"default_{name}"]=default
+            lines.append(f"    self.{name}=default_{name}")
+        for name,b0,nb,mask,nan,scale in pktcls.bit_fields:
+            raw=f"((payload>>(nbits-{b0+nb}))&{mask:#x})"
+            if scale is u:
+                value="raw"
+            elif scale is b:
+                value="raw!=0"
+            else:
+                ns[f"scale_{name}"]=scale
+                value=f"scale_{name}({nb},raw)"
+            if nan is not None:
+                value=f"None if raw=={nan} else {value}"
+            lines.append(f"    raw={raw}")
+            lines.append(f"    self.{name}={value}")
+        if hasattr(pktcls,"fixup"):
+            lines.append("    self.fixup()")
+        # Values for Packet.write(), with each attribute access written out
+        lines.append("def parent_values(self)->list:")
+        lines.append("    return ["+",".join([f"self.{name}" for name in pktcls.compiled_form.hq+pktcls.compiled_form.fq])+"]")
+        exec("\n".join(lines),ns)
+        pktcls.__init__=ns["__init__"]
+        pktcls.parent_values=ns["parent_values"]
+
     def __init__(self, nbits:int,payload: int):
-        for field in fields(self):
-            if "b0" in field.metadata:
-                raw=get_bitfield(nbits, payload, field.metadata["b0"], field.metadata["nb"])
-                if raw is None or ("nan" in field.metadata and raw==field.metadata["nan"]):
-                    setattr(self,field.name,None)
-                else:
-                    setattr(self,field.name,field.metadata["scale"](field.metadata["nb"],raw))
+        for name,default in self.default_fields:
+            setattr(self,name,default)
+        for name,b0,nb,mask,nan,scale in self.bit_fields:
+            shift=nbits-b0-nb
+            if shift>=0:
+                raw=(payload>>shift)&mask
+            else:
+                # Field runs off the end of the payload
+                raw=get_bitfield(nbits,payload,b0,nb)
+            if raw is None or raw==nan:
+                setattr(self,name,None)
+            else:
+                setattr(self,name,scale(nb,raw))
         if hasattr(self,"fixup"):
             self.fixup()
     msgcls.__init__ = __init__
@@ -437,21 +587,23 @@ def aismsg(msgcls):
         msgcls.__annotations__["slotofs"] = int
         def fixup_radio(self):
             if self.radio is not None:
-                # decode according to 3.3.7.2.3 from clarification
-                self.syncstate = get_bitfield(19, self.radio, 0, 2)
-                self.slotout = get_bitfield(19, self.radio, 2, 3)
+                # decode according to 3.3.7.2.3 from clarification. Radio field is
+                # only 19 bits, so pull the subfields out with shifts and masks directly.
+                r=self.radio
+                self.syncstate = (r>>17) & 0x3
+                self.slotout = (r>>14) & 0x7
                 if self.slotout in (3, 5, 7):
-                    self.nstation = get_bitfield(19, self.radio, 5, 14)
+                    self.nstation = r & 0x3FFF
                 elif self.slotout in (2, 4, 6):
-                    self.slot = get_bitfield(19, self.radio, 5, 14)
+                    self.slot = r & 0x3FFF
                 elif self.slotout == 1:
-                    this_h=get_bitfield(19, self.radio, 5, 5)
-                    this_m=get_bitfield(19, self.radio, 10, 7)
+                    this_h=(r>>9) & 0x1F
+                    this_m=(r>>2) & 0x7F
                     if this_h<24 and this_m<60:
                         self.utch = this_h
                         self.utcm = this_m
                 elif self.slotout == 0:
-                    self.slotofs = get_bitfield(19, self.radio, 5, 14)
+                    self.slotofs = r & 0x3FFF
         if hasattr(msgcls,'fixup'):
             old_fixup=msgcls.fixup
             def new_fixup(self):
@@ -464,8 +616,9 @@ def aismsg(msgcls):
     msgcls.__annotations__["utc_xmit"] = datetime
     msgcls.utc_recv = None
     msgcls.__annotations__["utc_recv"] = datetime
-    msgcls=dataclass(msgcls)
+    msgcls=dataclass(msgcls,slots=True)
     compile(msgcls)
+    codegen(msgcls)
     msgcls.use_epoch=False
     return msgcls
 
@@ -579,8 +732,8 @@ class msg5(Packet):
     mmsi:int  =field(metadata=md(8, 30, u,index=True,cacheindex=True))
     ais_version: int  =field(metadata=md(38, 2, u))
     imo: int  =field(metadata=md(40, 30, u,cache=True))
-    callsign: str  =field(metadata=md(70, 42, t,cache=True))
-    shipname: str  =field(metadata=md(112, 120, t,cache=True))
+    callsign: str  =field(metadata=md(70, 42, tc,cache=True))
+    shipname: str  =field(metadata=md(112, 120, tc,cache=True))
     shiptype: int  =field(metadata=md(232, 8, u,cache=True))
     to_bow: int  =field(metadata=md(240, 9, u,cache=True))
     to_stern: int  =field(metadata=md(249, 9, u,cache=True))
@@ -592,10 +745,67 @@ class msg5(Packet):
     hour: int  =field(metadata=md(283, 5, u,cache=True))
     minute: int  =field(metadata=md(288, 6, u,cache=True))
     draft: float  =field(metadata=md(294, 8, lambda nbits, payload: payload / 10,cache=True))
-    dest: str  =field(metadata=md(302, 120, t,cache=True))
+    dest: str  =field(metadata=md(302, 120, tc,cache=True))
     dte: bool  =field(metadata=md(422, 1, b,cache=True))
+    def cache_row(self):
+        """
+        Static data of this message as a row of _msg5_table, or None if any of it is missing
+        """
+        row=tuple(getattr(self,name) for name in _MSG5_DTYPE.names)
+        if self.mmsi is None or None in row:
+            return None
+        return np.array(tuple(x.encode('ascii') if isinstance(x,str) else x for x in row),dtype=_MSG5_DTYPE)
+    def cache_has_old_value(self, db):
+        # The table holds the last row written for each MMSI, so if this message
+        # matches the table, there is no need to ask the database.
+        i_row=_msg5_cache.get(self.mmsi)
+        if i_row is not None:
+            row=self.cache_row()
+            # Compare as tuples, since == on structured array elements is slow
+            if row is not None and _msg5_table[i_row].item()==row.item():
+                return self.CacheHasOldValue.PREV_SAME
+        # Not super(), since dataclass(slots=True) replaces this class with a new one
+        return Packet.cache_has_old_value(self, db)
+    def write(self,db,**kwargs)->None:
+        """
+        Write this message, then record it as the last static data written for this MMSI.
+        Only a message which made it to the database (or was already there) is recorded,
+        so the table never claims a row the database doesn't have.
+        """
+        global _msg5_table
+        Packet.write(self,db,**kwargs)
+        row=self.cache_row()
+        if row is None:
+            return
+        i_row=_msg5_cache.get(self.mmsi)
+        if i_row is None:
+            i_row=len(_msg5_cache)
+            if i_row>=len(_msg5_table):
+                _msg5_table=np.concatenate((_msg5_table,np.empty(len(_msg5_table),dtype=_MSG5_DTYPE)))
+            _msg5_cache[self.mmsi]=i_row
+        _msg5_table[i_row]=row
 register_msg(5,msg5)
 
+# Static data from msg5, one row per MMSI written so far. _msg5_cache maps MMSI to row
+# index in _msg5_table, which is doubled in size whenever it fills up.
+_MSG5_DTYPE=np.dtype([('imo','u4'),('callsign','S7'),('shipname','S20'),('shiptype','u1'),
+                      ('to_bow','u2'),('to_stern','u2'),('to_port','u1'),('to_stbd','u1'),
+                      ('epfd','u1'),('month','u1'),('day','u1'),('hour','u1'),('minute','u1'),
+                      ('draft','f4'),('dest','S20'),('dte','?')])
+_msg5_cache:dict[int,int]={}
+_msg5_table=np.empty(1024,dtype=_MSG5_DTYPE)
+
+
+def msg5_cached(mmsi:int):
+    """
+    Get the static data last written from a msg5 for a given MMSI
+
+    :param mmsi: MMSI of the ship
+    :return: Row of _msg5_table for this ship, or None if no msg5 has been written for it
+    """
+    i_row=_msg5_cache.get(mmsi)
+    return None if i_row is None else _msg5_table[i_row]
+
 
 @aismsg
 class msg6(Packet):
@@ -836,8 +1046,8 @@ class msg21(Packet):
         Safe_Water = 29
         Special_Mark = 30
         Light_Vessel = 31
-    aid_type:      AidTypes=field(metadata=md(38, 5, lambda nbits,payload:msg21.AidTypes(payload),cache=True))
-    name:      str=field(metadata=md(43, 120, sixbit,cache=True))
+    aid_type:      AidTypes=field(metadata=md(38, 5, e(AidTypes),cache=True))
+    name:      str=field(metadata=md(43, 120, sixbit_cached,cache=True))
     accuracy:      bool=field(metadata=md(163, 1, b,cache=True))
     lon:      float=field(metadata=md(164, 28, lambda nbits, payload: signed(nbits, payload) / (60 * 10000),cache=True))
     lat:      float=field(metadata=md(192, 27, lambda nbits, payload: signed(nbits, payload) / (60 * 10000),cache=True))
@@ -867,7 +1077,7 @@ class msg24a(Packet):
     repeat:      int  =field(metadata=md (6, 2, u,record=False))
     mmsi:      int  =field(metadata=md (8, 30, u))
     partno:      int  =field(metadata=md(38,2,u))
-    shipname:      str  =field(metadata=md(40,120,sixbit))
+    shipname:      str  =field(metadata=md(40,120,sixbit_cached))
 register_msg("24a",msg24a)
 
 
@@ -881,7 +1091,7 @@ class msg24b(Packet):
     vendorid:   str  =field(metadata=md(48, 18, sixbit))
     model:      int  =field(metadata=md(66, 4, u))
     serial:     int  =field(metadata=md(70, 20, u))
-    callsign:   str  =field(metadata=md(90, 42, sixbit))
+    callsign:   str  =field(metadata=md(90, 42, sixbit_cached))
     to_bow:     int  =field(metadata=md(132, 9, u))
     to_stern:   int  =field(metadata=md(141, 9, u))
     to_port:    int  =field(metadata=md(150, 6, u))
@@ -905,8 +1115,106 @@ class msg27(Packet):
 register_msg(27,msg27)
 
 
-def ensure_tables(db:Database,drop:bool=False):
-    for msgtype,msgdef in parse_payload.classes.items():
+def parse_posA_batch(payloads)->dict[str,np.ndarray]:
+    """
+    Decode many PositionA (type 1, 2, and 3) payloads at once into columns. This is
+    for bulk decoding, where the per-message path through parse_payload() and posA.__init__()
+    spends most of its time in the Python object model. Only the decoder is provided:
+    the database import still decodes one message at a time (see parse_aivdm_batch()).
+
+    :param payloads: Sequence of complete (single-fragment) armored payloads, each
+                     a str or bytes, all of which are expected to be type 1, 2, or 3.
+                     Check the msgtype column to filter out any that aren't.
+    :return: Dictionary of numpy arrays, keyed by posA field name, each with one element
+             per payload. Bit positions come from the posA field metadata. Scaling matches
+             the scalar path, except:
+             * Values which would be None in the scalar path are NaN, so any field which
+               can be None is float64
+             * status and maneuver are the raw enumeration values (uint8), not Enum members
+             * radio is the raw 19-bit radio status. The subfields decoded by fixup() are
+               not broken out.
+             * A short payload is padded with zero bits rather than having missing fields
+    """
+    packed=dearmor_batch(payloads,28)
+    raw={}
+    for this_field in fields(posA):
+        if "b0" in this_field.metadata:
+            raw[this_field.name]=get_bitfield_batch(packed,this_field.metadata["b0"],this_field.metadata["nb"]).astype(np.int64)
+    def nan_where(values,bad):
+        values=values.astype(np.float64)
+        values[bad]=np.nan
+        return values
+    turn=signed_vec(raw["turn"],8)
+    with np.errstate(invalid='ignore'):
+        turn_scaled=np.where(np.abs(turn)<=126,(np.abs(turn)/4.733)**2*np.sign(turn),np.inf*np.sign(turn))
+    turn_scaled[turn==-128]=np.nan
+    lon=signed_vec(raw["lon"],28)
+    lat=signed_vec(raw["lat"],27)
+    return {"msgtype":raw["msgtype"].astype(np.uint8),
+            "repeat":raw["repeat"].astype(np.uint8),
+            "mmsi":raw["mmsi"],
+            "status":raw["status"].astype(np.uint8),
+            "turn":turn_scaled,
+            "speed":nan_where(raw["speed"],raw["speed"]==511)/10,
+            "accuracy":raw["accuracy"].astype(bool),
+            "lon":nan_where(lon,lon==181*60*10000)/(60*10000),
+            "lat":nan_where(lat,lat==91*60*10000)/(60*10000),
+            "course":nan_where(raw["course"],raw["course"]==3600)/10,
+            "heading":nan_where(raw["heading"],raw["heading"]==511),
+            "second":nan_where(raw["second"],raw["second"]>=60),
+            "maneuver":raw["maneuver"].astype(np.uint8),
+            "raim":raw["raim"].astype(bool),
+            "radio":raw["radio"]}
+
+
+def parse_aivdm_batch(sentences):
+    """
+    Decode many AIVDM sentences at once. Single-fragment sentences whose message type
+    has an entry in parse_aivdm_batch.decoders are collected by type and decoded
+    together into columns. Everything else (multi-fragment messages and types
+    without a batch decoder) goes through parse_aivdm() one at a time.
+
+    :param sentences: Sequence of AIVDM sentences, with the checksum already removed,
+                      as passed to parse_aivdm()
+    :return: Tuple of:
+      * Dictionary keyed by message type. Each value is a tuple of an array of indexes into
+        sentences, and a dictionary of columns from the batch decoder for those sentences.
+      * List of (index into sentences, message object) for sentences decoded by parse_aivdm().
+        Sentences which parse_aivdm() doesn't return a message for (incomplete fragments,
+        type 0, or NotHandled) are left out.
+
+    import_ais_Atlantic23_05 doesn't use this. Its transmit-time reconstruction updates
+    per-MMSI state from each message in file order, then sets utc_xmit on each message
+    and writes it, so it needs one message object at a time. This is only for callers
+    which want whole columns, such as analysis of a log without going through the database.
+    """
+    batches={}
+    singles=[]
+    for i,sentence in enumerate(sentences):
+        parts=sentence.split(",")
+        if parts[1]=="1" and len(parts[5])>0:
+            # Message type is the whole first armored character
+            msgtype=int(_DEARMOR_TBL_ARR[ord(parts[5][0]) & 0xFF])
+            if msgtype in parse_aivdm_batch.decoders:
+                batch=batches.setdefault(msgtype,([],[]))
+                batch[0].append(i)
+                batch[1].append(parts[5])
+                continue
+        try:
+            msg=parse_aivdm(sentence)
+        except NotHandled:
+            continue
+        if msg is not None:
+            singles.append((i,msg))
+    return {msgtype:(np.array(indexes),parse_aivdm_batch.decoders[msgtype](payloads))
+            for msgtype,(indexes,payloads) in batches.items()},singles
+# Batch decoders, keyed by message type. Each takes a list of armored payloads and
+# returns a dictionary of columns.
+parse_aivdm_batch.decoders={1:parse_posA_batch,2:parse_posA_batch,3:parse_posA_batch}
+
+
+def ensure_tables(db:'Database',drop:bool=False):
+    for msgdef in [x for x in parse_payload.classes if x is not None]+list(parse_payload.subclasses.values()):
         ensure_table(db,msgdef,drop=drop,table_name=msgdef.table_name)
 
 
@@ -1037,6 +1345,7 @@ def get_msg_dt(binfn,i_line,msg,old_dt,file=None):
 
 
 def main():
+    from matplotlib import pyplot as plt
     puttylog = re.compile(
         r"=~=~=~=~=~=~=~=~=~=~=~= PuTTY log (?P<year>[0-9][0-9][0-9][0-9]).(?P<month>[0-9][0-9]).(?P<day>[0-9][0-9]) (?P<hour>[0-9][0-9]):(?P<minute>[0-9][0-9]):(?P<second>[0-9][0-9]).*")
     line_timestamp=re.compile(r"^(?P<year>[0-9][0-9][0-9][0-9])-(?P<month>[0-9][0-9])-(?P<day>[0-9][0-9])T(?P<hour>[0-9][0-9]):(?P<minute>[0-9][0-9]):(?P<second>[0-9][0-9]).*")
@@ -1,31 +1,30 @@
+import sys
+
+import numpy as np
+
 #  x0    x1    x2    x3    x4    x5    x6    x7    x8    x9    xa    xb    xc    xd    xe    xf
 low_sub = ('\u2400\u263A\u263b\u2665\u2666\u2663\u2660\u2022\u25d8\u25cb\u25d9\u2642\u2640\u266a\u266b\u263c' +
            '\u25ba\u25c4\u2195\u203c\u00b6\u00a7\u25ac\u21a8\u2191\u2193\u2192\u2190\u221f\u2194\u25b2\u25bc\u2420')
 
 
+# Text for each possible byte value, in the hex part and the text part of dump_bin()
+hex_table = [f"{b:02x}" for b in range(256)]
+ascii_table = [low_sub[b] if b < len(low_sub) else chr(b) for b in range(256)]
+
+
 def dump_bin(buf, word_len=4, words_per_line=8):
     line_len = word_len * words_per_line
+    out = []
     for i_line in range((len(buf) // line_len) + 1):
         i_line0 = i_line * line_len
-        i_line1 = (i_line + 1) * line_len
-        print(f"{i_line0:04x} - ", end='')
-        for i_byte_in_line, i_byte in enumerate(range(i_line0, i_line1)):
-            if i_byte < len(buf):
-                print(f"{buf[i_byte]:02x}", end='')
-            else:
-                print("  ", end='')
-            if (i_byte_in_line + 1) % 4 == 0:
-                print(" ", end='')
-        print("|", end='')
-        for i_byte_in_line, i_byte in enumerate(range(i_line0, i_line1)):
-            if i_byte < len(buf):
-                if buf[i_byte] < len(low_sub):
-                    print(low_sub[buf[i_byte]], end='')
-                else:
-                    print(str(buf[i_byte:i_byte + 1], encoding='iso8859-1'), end='')
-            else:
-                print(" ", end='')
-        print("")
+        chunk = buf[i_line0:i_line0 + line_len]
+        pad = line_len - len(chunk)
+        hex_part = [hex_table[b] for b in chunk] + ["  "] * pad
+        hex_str = "".join(["".join(hex_part[k:k + 4]) + (" " if k + 4 <= line_len else "")
+                           for k in range(0, line_len, 4)])
+        asc_str = "".join([ascii_table[b] for b in chunk]) + " " * pad
+        out.append(f"{i_line0:04x} - {hex_str}|{asc_str}\n")
+    sys.stdout.write("".join(out))
 
 
 def signed(data: int, nbits: int) -> int:
@@ -36,6 +35,14 @@ def signed(data: int, nbits: int) -> int:
         return -(1 << signbit) + (data & ((1 << signbit) - 1))
 
 
+def signed_vec(data: np.ndarray, nbits: int) -> np.ndarray:
+    """
+    Same as signed(), but on a whole array of values at once
+    """
+    data = data.astype(np.int64)
+    return data - ((data >> (nbits - 1)) & 1) * (1 << nbits)
+
+
 def test_signed():
     assert signed(0x80, 8) == -128
     assert signed(0xFF, 8) == -1
@@ -46,6 +53,13 @@ def test_signed():
     assert signed(0x7fffff, 24) == 0x7fffff
 
 
+def test_signed_vec():
+    data = np.array([0x80, 0xFF, 0x00, 0x7f])
+    assert list(signed_vec(data, 8)) == [signed(x, 8) for x in data]
+    data = np.array([0xFFFFFF, 0x000000, 0x7fffff, 0x800000])
+    assert list(signed_vec(data, 24)) == [signed(x, 24) for x in data]
+
+
 def get_bits(source: int, b1: int, b0: int):
     size = b1 - b0 + 1
     mask = (1 << (size)) - 1
@@ -54,4 +68,5 @@ def get_bits(source: int, b1: int, b0: int):
 
 
 if __name__ == "__main__":
-    test_signed()
\ No newline at end of file
+    test_signed()
+    test_signed_vec()
\ No newline at end of file
@@ -1,6 +1,11 @@
-import json
 from typing import BinaryIO
 
+try:
+    # orjson is several times faster than the standard library, if available
+    from orjson import loads
+except ImportError:
+    from json import loads
+
 from packet import read_packet
 
 
@@ -14,13 +19,11 @@ def read_json_packet(header: bytes, inf: BinaryIO):
     :param inf:
     :return:
     """
-    # Looks like JSON, read until the 0D0A
-    result = header
-    while result[-1] != 0x0A:
-        result += inf.read(1)
+    # Looks like JSON, read until the 0D0A. readline() scans the stream's buffer in C,
+    # and never consumes anything past the 0A, so the next packet is still there.
+    result = header + inf.readline()
     try:
-        return json.loads(result)
+        return loads(result)
     except:
         return str(result, encoding='cp437')
 read_packet.classes[ord('{')]=read_json_packet
-
@@ -10,12 +10,15 @@ from collections import namedtuple
 from dataclasses import field, dataclass, fields
 from datetime import datetime
 from enum import Enum
+from itertools import groupby
+from operator import itemgetter
 from typing import Iterable, Callable, ClassVar
+import warnings
 
-from psycopg import connect
+import numpy as np
 
 
-@dataclass
+@dataclass(slots=True)
 class GPSSat:
     svn:int
     class Block(Enum):
@@ -77,6 +80,8 @@ gps_constellation={
     31:GPSSat(svn=52,block=GPSSat.Block.IIR_M,serial= 2,plane='A',slot=2,clock=GPSSat.Clock.Rb,USA=190,launch_date=datetime(2006, 9,25,18,50),launch_vehicle='Delta II 7925-9.5 #318',retire_date=None),
     32:GPSSat(svn=70,block=GPSSat.Block.IIF  ,serial=12,plane='F',slot=1,clock=GPSSat.Clock.Rb,USA=266,launch_date=datetime(2016, 2, 5,13,38),launch_vehicle='Atlas V 401 AV-057',retire_date=None),
 }
+# Same, indexed directly by PRN, with None for PRNs not currently assigned
+gps_constellation_by_prn=tuple(gps_constellation.get(prn) for prn in range(33))
 
 
 
@@ -90,12 +95,7 @@ def get_bits(dwrd:Iterable[int], b0:int, b1:int):
     :return: unsigned int raw bitfield
     """
     dwrd_i = (b0 - 1) // 30
-    rel_0 = b0 - (dwrd_i) * 30
-    rel_1 = b1 - (dwrd_i) * 30
-    width = rel_1 - rel_0 + 1
-    shift = 30 - rel_1
-    mask = (1 << width) - 1
-    return (dwrd[dwrd_i] >> shift) & mask
+    return (dwrd[dwrd_i] >> (30*(dwrd_i+1) - b1)) & ((1 << (b1 - b0 + 1)) - 1)
 
 
 def get_multi_bits(dwrd:Iterable[int], parts:Iterable[tuple[int,int]], signed:bool):
@@ -107,16 +107,27 @@ def get_multi_bits(dwrd:Iterable[int], parts:Iterable[tuple[int,int]], signed:bo
     :param signed:
     :return:
     """
+    if len(parts) == 1:
+        # Most fields are contiguous
+        (b0, b1), = parts
+        width = b1 - b0 + 1
+        dwrd_i = (b0 - 1) // 30
+        result = (dwrd[dwrd_i] >> (30*(dwrd_i+1) - b1)) & ((1 << width) - 1)
+        if signed:
+            cutoff = 1 << (width - 1)
+            result = (result ^ cutoff) - cutoff
+        return result
     result = 0
     width = 0
     for (b0, b1) in parts:
-        result = result << (b1 - b0 + 1)
-        result = result | get_bits(dwrd, b0, b1)
-        width += (b1 - b0 + 1)
+        part_width = b1 - b0 + 1
+        dwrd_i = (b0 - 1) // 30
+        result = (result << part_width) | ((dwrd[dwrd_i] >> (30*(dwrd_i+1) - b1)) & ((1 << part_width) - 1))
+        width += part_width
     if signed:
+        # Sign-extend: flip the sign bit, then rebias by its weight
         cutoff = 1 << (width - 1)
-        if result >= cutoff:
-            result -= 2 * cutoff
+        result = (result ^ cutoff) - cutoff
     return result
 
 
@@ -154,11 +165,72 @@ def l1ca_md(parts:Iterable[tuple[int,int]], **kwargs):
 
 
 def compile_msg(cls):
+    """
+    Precompute the extraction table for a message class, so that parse_payload doesn't
+    have to dig through the field metadata for each message. Use as a decorator
+    outside of @dataclass.
+
+    Each row of cls.parts_table is (name,parts,cutoff,scale,scale_is_fn):
+      * parts is a tuple of (dwrd_i,shift,mask,width) for each part, most significant first
+      * cutoff is the sign bit value for signed fields, or 0 for unsigned fields
+      * scale is the scale number or callable from the metadata, or None
+
+    cls.parts_gather is the same parts flattened in table order into a (3,nparts)
+    array of dwrd_i, shift, and mask, for extracting every part of many payloads at once.
+    """
+    cls.parts_table=[]
+    for field in fields(cls):
+        if 'parts' not in field.metadata:
+            continue
+        parts=[]
+        total_width=0
+        for (b0,b1) in field.metadata['parts']:
+            dwrd_i=(b0-1)//30
+            width=b1-b0+1
+            parts.append((dwrd_i,30-(b1-dwrd_i*30),(1<<width)-1,width))
+            total_width+=width
+        cutoff=1<<(total_width-1) if field.metadata.get('signed',False) else 0
+        scale=field.metadata.get('scale',None)
+        cls.parts_table.append((field.name,tuple(parts),cutoff,scale,callable(scale)))
+    cls.parts_gather=np.array([(dwrd_i,shift,mask) for _,parts,_,_,_ in cls.parts_table
+                                                   for dwrd_i,shift,mask,_ in parts],dtype=np.int64).reshape(-1,3).T
+    codegen(cls)
     cls.compiled_form=True
     return cls
 
 
-@dataclass
+def codegen(cls):
+    """
+    Generate a specialized parse_payload for a message class from its parts_table.
+    Word indexes, shifts, masks, and numeric scales are written into the code as
+    constants, so each field is a straight line of shifts and masks with no loop
+    over parts and no branching on the kind of scale.
+    """
+    ns={}
+    lines=["def parse_payload(self,payload):"]
+    for name,parts,cutoff,scale,scale_is_fn in cls.parts_table:
+        raw=f"((payload[{parts[0][0]}]>>{parts[0][1]})&{parts[0][2]:#x})"
+        for dwrd_i,shift,mask,width in parts[1:]:
+            raw=f"(({raw})<<{width})|((payload[{dwrd_i}]>>{shift})&{mask:#x})"
+        if cutoff:
+            raw=f"(({raw})^{cutoff:#x})-{cutoff:#x}"
+        lines.append(f"    raw={raw}")
+        if scale_is_fn:
+            ns[f"scale_{name}"]=scale
+            value=f"scale_{name}(raw)"
+        elif scale is not None:
+            value=f"{scale!r}*raw"
+        else:
+            value="raw"
+        lines.append(f"    self.{name}={value}")
+    if len(lines)==1:
+        lines.append("    pass")
+    exec("\n".join(lines),ns)
+    cls.parse_payload=ns["parse_payload"]
+
+
+@compile_msg
+@dataclass(slots=True)
 class L1CAMessage:
     # svid - not encoded in message, therefore must come from another source like rxm_sfrbx record
     prn:int
@@ -172,52 +244,48 @@ class L1CAMessage:
     alert     :bool=field(metadata=l1ca_md([(48,48)],scale=bool))
     antispoof :bool=field(metadata=l1ca_md([(49,49)],scale=bool))
     subframe  :int=field(metadata=l1ca_md([(50,52)]))
+    # Raw dwrd words the message was decoded from
+    payload   :list[int]=field(repr=False,compare=False)
     # Factory map: A dictionary used in the factory method read_msg(). The
     # key of each is an int, and the value is a callable which takes a payload
     # and returns an object of class L1CAMessage. Register each callable like this:
     # class Subframe1(L1CAMessage):
     #    ...
-    #    def __init__(self,payload:Iterable[int])->'L1CAMessage':
-    #        super().parse_payload(payload)
-    # L1CAMessage.subframe[1]=Subframe1
+    #    def __init__(self,svid:int,subframe:int,payload:Iterable[int])->'L1CAMessage':
+    #        L1CAMessage.__init__(self,svid,subframe,payload)
+    # L1CAMessage.factory_map[1]=Subframe1
+    # Name the parent class explicitly rather than using super(), which doesn't
+    # work in a dataclass with slots=True.
     factory_map:ClassVar[dict[int,Callable[[Iterable[int]], 'L1CAMessage']]]={}
     factory_map45:ClassVar[dict[int,Callable[[Iterable[int]], 'L1CAMessage']]]={}
     @staticmethod
-    def read_msg(svid:int,payload: Iterable[int]) -> 'L1CAMessage':
+    def read_msg(svid:int,payload: Iterable[int]|np.ndarray) -> 'L1CAMessage':
+        if isinstance(payload,np.ndarray):
+            # Decode from Python ints. Arithmetic on numpy uint32 scalars is slower,
+            # and wraps around in the sign extension.
+            payload=payload.tolist()
         subframe = get_bits(payload, 50, 52)
         if subframe==4 or subframe==5:
             page_id=get_bits(payload,63,63+6-1)
-            if page_id in L1CAMessage.factory_map45:
-                return L1CAMessage.factory_map45[page_id](svid, subframe, payload)
-            else:
-                return L1CAMessage.factory_map[subframe](svid, subframe, payload)
-        elif subframe in L1CAMessage.factory_map:
-            return L1CAMessage.factory_map[subframe](svid,subframe,payload)
+            factory=L1CAMessage.factory_map45.get(page_id,L1CAMessage.factory_map[subframe])
         else:
-            return L1CAMessage(svid,subframe,payload)
-    def parse_payload(self,payload:Iterable[int]):
-        for field in fields(self):
-            if 'parts' in field.metadata:
-                value = get_multi_bits(payload, field.metadata['parts'], field.metadata.get('signed',False))
-                scale=field.metadata.get('scale',None)
-                if callable(scale):
-                    value = scale(value)
-                elif scale is not None:
-                    value = scale * value
-                setattr(self,field.name,value)
+            factory=L1CAMessage.factory_map.get(subframe,L1CAMessage)
+        return factory(svid,subframe,payload)
+    # parse_payload(self,payload) is generated for each class by compile_msg()
     def __init__(self,svid:int,subframe:int,payload:Iterable[int]):
         """
 
         :param payload:
         """
         self.prn=svid
-        self.sat=gps_constellation[self.prn]
+        self.sat=gps_constellation_by_prn[self.prn]
         self.subframe=subframe
         self.payload = payload
         self.parse_payload(payload)
 
 
-@dataclass
+@compile_msg
+@dataclass(slots=True)
 class Subframe1(L1CAMessage):
     wn       :int=field(metadata=l1ca_md([(61,70)],unit="week"))
     msg_on_l2:int=field(metadata=l1ca_md([(71,72)]))
@@ -237,7 +305,9 @@ class Subframe1(L1CAMessage):
         if N <= 6:
             return 2 ** (1 + N / 2)
         return 2 ** (N - 2)
-    ura:int=field(metadata=l1ca_md([(73,76)],scale=ura_nom))
+    # Nominal URA for each of the 16 possible encoded values
+    ura_table=tuple(map(ura_nom,range(16)))
+    ura:int=field(metadata=l1ca_md([(73,76)],scale=ura_table.__getitem__))
     sv_health:int=field(metadata=l1ca_md([(77,82)]))
     iodc:int=field(metadata=l1ca_md([(83,84),(211,218)]))
     t_gd:float=field(metadata=l1ca_md([(197,197+8-1)],signed=True,scale=2**-31,unit="s"))
@@ -246,10 +316,11 @@ class Subframe1(L1CAMessage):
     a_f1:float=field(metadata=l1ca_md([(241+8,241+8+16-1)],signed=True,scale=2**-43,unit="s/s"))
     a_f0:float=field(metadata=l1ca_md([(271,271+22-1)],signed=True,scale=2**-31,unit="s"))
     def __init__(self,svid:int,subframe:int,payload:Iterable[int])->'Subframe1':
-        super().__init__(svid,subframe,payload)
+        L1CAMessage.__init__(self,svid,subframe,payload)
 L1CAMessage.factory_map[1]=Subframe1
 
-@dataclass
+@compile_msg
+@dataclass(slots=True)
 class Subframe2(L1CAMessage):
     iode:int=field(metadata=l1ca_md([(61,68)]))
     c_rs:float=field(metadata=l1ca_md([(69,69+16-1)],signed=True,scale=2**-5,unit="m"))
@@ -263,10 +334,11 @@ class Subframe2(L1CAMessage):
     fit:int=field(metadata=l1ca_md([(287,287)]))
     aodo:int=field(metadata=l1ca_md([(288,288+5-1)],scale=900,unit="s"))
     def __init__(self,svid:int,subframe:int,payload:Iterable[int])->'Subframe2':
-        super().__init__(svid,subframe,payload)
+        L1CAMessage.__init__(self,svid,subframe,payload)
 L1CAMessage.factory_map[2]=Subframe2
 
-@dataclass
+@compile_msg
+@dataclass(slots=True)
 class Subframe3(L1CAMessage):
     c_ic:int=field(metadata=l1ca_md([(61, 77-1)], signed=True,scale=2**-29,unit="rad"))
     Omega_0:float=field(metadata=l1ca_md([(77,77+8-1),(91,91+24-1)], signed=True, scale=2 ** -31, unit="semicircle"))
@@ -278,20 +350,22 @@ class Subframe3(L1CAMessage):
     iode:float=field(metadata=l1ca_md([(271, 271 + 8 - 1)]))
     idot:float=field(metadata=l1ca_md([(279,279+14-1)], scale=2 ** -43, unit="s"))
     def __init__(self,svid:int,subframe:int,payload:Iterable[int])->'Subframe3':
-        super().__init__(svid,subframe,payload)
+        L1CAMessage.__init__(self,svid,subframe,payload)
 L1CAMessage.factory_map[3]=Subframe3
 
 
-@dataclass
+@compile_msg
+@dataclass(slots=True)
 class Subframe45(L1CAMessage):
     data_id:int=field(metadata=l1ca_md([(61,61+2-1)]))
     page_id:int=field(metadata=l1ca_md([(63,63+6-1)]))
     def __init__(self,svid:int,subframe:int,payload:Iterable[int])->'Subframe45':
-        super().__init__(svid,subframe,payload)
+        L1CAMessage.__init__(self,svid,subframe,payload)
 L1CAMessage.factory_map[4]=Subframe45
 L1CAMessage.factory_map[5]=Subframe45
 
-@dataclass
+@compile_msg
+@dataclass(slots=True)
 class Almanac(Subframe45):
     e:float=field(metadata=l1ca_md([(69,69+16-1)],scale=2**-21))
     t_oa:int=field(metadata=l1ca_md([(91,91+8-1)],scale=2**12,unit="s"))
@@ -305,7 +379,7 @@ class Almanac(Subframe45):
     a_f0:float=field(metadata=l1ca_md([(271,271+8-1),(290,290+3-1)],signed=True,scale=2**-20,unit="s"))
     a_f1:float=field(metadata=l1ca_md([(279,279+11-1)],signed=True,scale=2**-38,unit="s/s"))
     def __init__(self,svid:int,subframe:int,payload:Iterable[int])->'Almanac':
-        super().__init__(svid,subframe,payload)
+        Subframe45.__init__(self,svid,subframe,payload)
 # This one is treated as default
 for i in range(1,33):
     L1CAMessage.factory_map45[i]=Almanac #Subframe 5, pages 1-24, subframe 4, pages 2,3,4,5,7,8,9,10
@@ -344,85 +418,85 @@ class HealthEnum(Enum):
     SV_Will_Be_Out = 0b11101
     One_Or_More_Deformed_URA_Accurate = 0b11110
     Multiple_Anomalies = 0b11111
+# Same, indexed directly by value
+health_by_value=tuple(HealthEnum(i) for i in range(32))
 
 
-@dataclass
+@dataclass(slots=True)
 class Health:
     lnavBad: bool
     bits: HealthEnum
     def __init__(self,raw):
-        self.lnavBad=raw>32
-        self.bits=HealthEnum(raw%32)
+        self.lnavBad=bool(raw>>5)
+        self.bits=health_by_value[raw&0x1f]
+
 
+# Start and end bits of the 6-bit health of each SV in subframe 5 page 25, SV01 first
+sv_health_pos=tuple(((slot_num//4+3)*30+1+(slot_num%4)*6,(slot_num//4+3)*30+1+(slot_num%4)*6+6-1) for slot_num in range(1,25))
 
-@dataclass
+
+@compile_msg
+@dataclass(slots=True)
 class SVHealth(Subframe45):
     """
     All fields are marked reserved and are undocumented
     """
     t_oa:int=field(metadata=l1ca_md([(69,69+8-1)],scale=2**12,unit="s"))
     wn_a:int=field(metadata=l1ca_md([(69+8,69+8+8-1)],unit="week"))
-
-    @staticmethod
-    def slot_pos(slot_num:int)->tuple[int,int]:
-        b0=(slot_num//4+3)*30+1+(slot_num%4)*6
-        b1=b0+6-1
-        return (b0,b1)
-    SV01Health:Health=field(metadata=l1ca_md([slot_pos( 1)],scale=Health))
-    SV02Health:Health=field(metadata=l1ca_md([slot_pos( 2)],scale=Health))
-    SV03Health:Health=field(metadata=l1ca_md([slot_pos( 3)],scale=Health))
-    SV04Health:Health=field(metadata=l1ca_md([slot_pos( 4)],scale=Health))
-    SV05Health:Health=field(metadata=l1ca_md([slot_pos( 5)],scale=Health))
-    SV06Health:Health=field(metadata=l1ca_md([slot_pos( 6)],scale=Health))
-    SV07Health:Health=field(metadata=l1ca_md([slot_pos( 7)],scale=Health))
-    SV08Health:Health=field(metadata=l1ca_md([slot_pos( 8)],scale=Health))
-    SV09Health:Health=field(metadata=l1ca_md([slot_pos( 9)],scale=Health))
-    SV10Health:Health=field(metadata=l1ca_md([slot_pos(10)],scale=Health))
-    SV11Health:Health=field(metadata=l1ca_md([slot_pos(11)],scale=Health))
-    SV12Health:Health=field(metadata=l1ca_md([slot_pos(12)],scale=Health))
-    SV13Health:Health=field(metadata=l1ca_md([slot_pos(13)],scale=Health))
-    SV14Health:Health=field(metadata=l1ca_md([slot_pos(14)],scale=Health))
-    SV15Health:Health=field(metadata=l1ca_md([slot_pos(15)],scale=Health))
-    SV16Health:Health=field(metadata=l1ca_md([slot_pos(16)],scale=Health))
-    SV17Health:Health=field(metadata=l1ca_md([slot_pos(17)],scale=Health))
-    SV18Health:Health=field(metadata=l1ca_md([slot_pos(18)],scale=Health))
-    SV19Health:Health=field(metadata=l1ca_md([slot_pos(19)],scale=Health))
-    SV20Health:Health=field(metadata=l1ca_md([slot_pos(20)],scale=Health))
-    SV21Health:Health=field(metadata=l1ca_md([slot_pos(21)],scale=Health))
-    SV22Health:Health=field(metadata=l1ca_md([slot_pos(22)],scale=Health))
-    SV23Health:Health=field(metadata=l1ca_md([slot_pos(23)],scale=Health))
-    SV24Health:Health=field(metadata=l1ca_md([slot_pos(24)],scale=Health))
+    SV01Health:Health=field(metadata=l1ca_md([sv_health_pos[ 0]],scale=Health))
+    SV02Health:Health=field(metadata=l1ca_md([sv_health_pos[ 1]],scale=Health))
+    SV03Health:Health=field(metadata=l1ca_md([sv_health_pos[ 2]],scale=Health))
+    SV04Health:Health=field(metadata=l1ca_md([sv_health_pos[ 3]],scale=Health))
+    SV05Health:Health=field(metadata=l1ca_md([sv_health_pos[ 4]],scale=Health))
+    SV06Health:Health=field(metadata=l1ca_md([sv_health_pos[ 5]],scale=Health))
+    SV07Health:Health=field(metadata=l1ca_md([sv_health_pos[ 6]],scale=Health))
+    SV08Health:Health=field(metadata=l1ca_md([sv_health_pos[ 7]],scale=Health))
+    SV09Health:Health=field(metadata=l1ca_md([sv_health_pos[ 8]],scale=Health))
+    SV10Health:Health=field(metadata=l1ca_md([sv_health_pos[ 9]],scale=Health))
+    SV11Health:Health=field(metadata=l1ca_md([sv_health_pos[10]],scale=Health))
+    SV12Health:Health=field(metadata=l1ca_md([sv_health_pos[11]],scale=Health))
+    SV13Health:Health=field(metadata=l1ca_md([sv_health_pos[12]],scale=Health))
+    SV14Health:Health=field(metadata=l1ca_md([sv_health_pos[13]],scale=Health))
+    SV15Health:Health=field(metadata=l1ca_md([sv_health_pos[14]],scale=Health))
+    SV16Health:Health=field(metadata=l1ca_md([sv_health_pos[15]],scale=Health))
+    SV17Health:Health=field(metadata=l1ca_md([sv_health_pos[16]],scale=Health))
+    SV18Health:Health=field(metadata=l1ca_md([sv_health_pos[17]],scale=Health))
+    SV19Health:Health=field(metadata=l1ca_md([sv_health_pos[18]],scale=Health))
+    SV20Health:Health=field(metadata=l1ca_md([sv_health_pos[19]],scale=Health))
+    SV21Health:Health=field(metadata=l1ca_md([sv_health_pos[20]],scale=Health))
+    SV22Health:Health=field(metadata=l1ca_md([sv_health_pos[21]],scale=Health))
+    SV23Health:Health=field(metadata=l1ca_md([sv_health_pos[22]],scale=Health))
+    SV24Health:Health=field(metadata=l1ca_md([sv_health_pos[23]],scale=Health))
 
     def __init__(self,svid:int,subframe:int,payload:Iterable[int])->'SVHealth':
-        super().__init__(svid,subframe,payload)
+        Subframe45.__init__(self,svid,subframe,payload)
 L1CAMessage.factory_map45[51]=SVHealth #Subframe 5, page 25
 
 
-@dataclass
+@compile_msg
+@dataclass(slots=True)
 class SpecialMessage(Subframe45):
     special_msg:str
+    # Word index and shift of each of the 22 8-bit characters, in message order
+    char_pos:ClassVar[tuple[tuple[int,int],...]]=tuple(((b0-1)//30,30*((b0-1)//30+1)-(b0+8-1)) for b0 in
+                                                       [69,69+8]+[(i-1)*30+j*8+1 for i in range(4,10) for j in range(3)]+[271,271+8])
     def __init__(self,svid:int,subframe:int,payload:Iterable[int])->'SVHealth':
-        super().__init__(svid,subframe,payload)
-        buf=[get_bits(payload,69,69+8-1),get_bits(payload,69+8,69+8+8-1)]
-        for i in range(4,10):
-            for j in range(3):
-                b0=(i-1)*30+j*8+1
-                buf=buf+[get_bits(payload,b0,b0+8-1)]
-        buf+=[get_bits(payload,271,271+8-1),get_bits(payload,271+8,271+8+8-1)]
-        self.special_msg=str(bytes(buf),encoding='cp437')
+        Subframe45.__init__(self,svid,subframe,payload)
+        self.special_msg=str(bytes([(payload[dwrd_i]>>shift)&0xff for dwrd_i,shift in self.char_pos]),encoding='cp437')
         #print(self.special_msg)
 L1CAMessage.factory_map45[55]=SpecialMessage #Subframe 4, page 17
 
 
 
 
-@dataclass
+@compile_msg
+@dataclass(slots=True)
 class Subframe45Reserved(Subframe45):
     """
     All fields are marked reserved and are undocumented
     """
     def __init__(self,svid:int,subframe:int,payload:Iterable[int])->'Subframe45Reserved':
-        super().__init__(svid,subframe,payload)
+        Subframe45.__init__(self,svid,subframe,payload)
 L1CAMessage.factory_map45[57]=Subframe45Reserved #Subframe 4, pages 1,6,11,16,21
 L1CAMessage.factory_map45[62]=Subframe45Reserved #Subframe 4, page 12,24
 L1CAMessage.factory_map45[58]=Subframe45Reserved #Subframe 4, page 19
@@ -431,23 +505,104 @@ L1CAMessage.factory_map45[60]=Subframe45Reserved #Subframe 4, page 22
 L1CAMessage.factory_map45[61]=Subframe45Reserved #Subframe 4, page 23
 
 
+def parse_payload_batch(cls,payloads:np.ndarray)->dict[str,np.ndarray]:
+    """
+    Decode many payloads of the same message class at once into columns, using the
+    class parts_table. This is the bulk counterpart of cls.parse_payload().
+
+    :param cls: Message class, decorated with compile_msg
+    :param payloads: (N,10) array of dwrd words
+    :return: Dictionary of numpy arrays, keyed by field name, each with one element per
+             payload. Numeric scales are applied as an array operation. Callable scales
+             are applied per element, so fields like Health are object arrays.
+    """
+    payloads=np.asarray(payloads,dtype=np.int64)
+    # Extract every part of every payload in one gather, shift, and mask
+    dwrd_i,shift,mask=cls.parts_gather
+    part_values=(payloads[:,dwrd_i]>>shift)&mask
+    result={}
+    i_part=0
+    for name,parts,cutoff,scale,scale_is_fn in cls.parts_table:
+        raw=part_values[:,i_part]
+        for _,_,_,width in parts[1:]:
+            i_part+=1
+            raw=(raw<<width)|part_values[:,i_part]
+        i_part+=1
+        if cutoff:
+            raw=(raw^cutoff)-cutoff
+        if scale is bool:
+            result[name]=raw!=0
+        elif scale_is_fn:
+            result[name]=np.array([scale(value) for value in raw.tolist()])
+        elif scale is not None:
+            result[name]=scale*raw
+        else:
+            result[name]=raw
+    return result
+
+
+def read_msg_batch(payloads:np.ndarray)->dict[type,tuple[np.ndarray,dict[str,np.ndarray]]]:
+    """
+    Bulk counterpart of L1CAMessage.read_msg(). Classify each payload the same way,
+    then decode each class in one pass with parse_payload_batch().
+
+    :param payloads: (N,10) array of dwrd words
+    :return: Dictionary keyed by message class. Each value is a tuple of the row indexes
+             into payloads of that class, and the columns decoded from those rows.
+    """
+    payloads=np.asarray(payloads,dtype=np.int64)
+    subframe=(payloads[:,1]>>8)&0x7
+    page_id=(payloads[:,2]>>22)&0x3f
+    rows={}
+    for this_subframe in np.unique(subframe).tolist():
+        in_subframe=subframe==this_subframe
+        if this_subframe==4 or this_subframe==5:
+            for this_page_id in np.unique(page_id[in_subframe]).tolist():
+                cls=L1CAMessage.factory_map45.get(this_page_id,L1CAMessage.factory_map[this_subframe])
+                rows.setdefault(cls,[]).append(np.flatnonzero(in_subframe & (page_id==this_page_id)))
+        else:
+            cls=L1CAMessage.factory_map.get(this_subframe,L1CAMessage)
+            rows.setdefault(cls,[]).append(np.flatnonzero(in_subframe))
+    result={}
+    for cls,idx in rows.items():
+        idx=np.sort(np.concatenate(idx))
+        result[cls]=(idx,parse_payload_batch(cls,payloads[idx]))
+    return result
+
+
 def main():
+    # Only needed here, so that the decoders can be imported without a database driver
+    from psycopg import connect
     dbname="Atlantic23_05"
     import_files=False
     do_plot=True
     drop=False
     profile=False
     with connect(f"dbname={dbname} user=jeppesen password=Locking1blitz",autocommit=True) as conn:
-        head_cur=conn.cursor()
-        block_cur=conn.cursor()
-        head_cur.execute("select id,svid from rxm_sfrbx where sigid='GPS_L1CA' order by id asc;")
-        for id,svid in head_cur:
-            block_cur.execute("select dwrd from rxm_sfrbx_block where parent=%s order by id asc;",(id,))
-            payload=[dwrd for dwrd, in block_cur]
-            msg=L1CAMessage.read_msg(svid,payload)
-            print(msg)
-            if type(msg)==SpecialMessage:
-                print(msg)
+        svids=[]
+        payloads=[]
+        # Stream the blocks through a server-side cursor, one row per dwrd, and
+        # regroup them into payloads here.
+        with conn.transaction(), conn.cursor(name='l1ca_stream') as cur:
+            cur.itersize=10000
+            cur.execute("""select h.id,h.svid,b.dwrd
+                           from rxm_sfrbx h join rxm_sfrbx_block b on b.parent=h.id
+                           where h.sigid='GPS_L1CA' order by h.id,b.id;""")
+            for (id,svid),rows in groupby(cur,key=itemgetter(0,1)):
+                dwrds=[dwrd for _,_,dwrd in rows]
+                if len(dwrds)!=10:
+                    # Every payload must be the same length to go in one array
+                    warnings.warn(f"Skipping rxm_sfrbx id {id}, which has {len(dwrds)} words instead of 10")
+                    continue
+                svids.append(svid)
+                payloads.append(dwrds)
+        payloads=np.array(payloads,dtype=np.uint32)
+        for cls,(idx,columns) in read_msg_batch(payloads).items():
+            print(cls.__name__,len(idx))
+            if cls is SpecialMessage:
+                # Only build objects for the messages we actually look at
+                for i in idx.tolist():
+                    print(L1CAMessage.read_msg(svids[i],payloads[i]))
 
 
 if __name__=="__main__":
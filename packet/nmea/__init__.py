@@ -1,3 +1,4 @@
+import math
 import re
 from typing import BinaryIO
 
@@ -7,7 +8,6 @@ import os.path
 import datetime
 
 import numpy as np
-import pytz
 from track import Track
 
 from packet import read_packet
@@ -23,16 +23,41 @@ def read_nmea_packet(header: bytes, inf: BinaryIO):
     :param inf:
     :return:
     """
-    # Looks like JSON, read until the 0D0A
-    result = header
-    while result[-1] != 0x0A:
-        result += inf.read(1)
+    # Read until the 0D0A. readline() scans the stream's buffer in C, and never
+    # consumes anything past the 0A, so the next packet is still there.
+    result = header + inf.readline()
     return str(result, encoding='cp437').strip()
 read_packet.classes[ord('$')]=read_nmea_packet
 
 
 
-re_nmea=re.compile(".*\\$([^*]*)\*([0-9A-F][0-9A-F])?.*")
+nmea_hex="0123456789ABCDEF"
+def split_nmea(line:str):
+    """
+    Find the NMEA sentence in a line of text. This does with a couple of find()s
+    what a frame regex would, without starting the regex engine on every line.
+    If a lost line feed has joined two sentences, this returns the last one, the
+    same as the original greedy '.*\\$([^*]*)\\*' regex did.
+
+    :param line: Line of text, which may have junk before or after the sentence
+    :return: None if there is no $...* frame in the line, otherwise a tuple of:
+      * Sentence body between the $ and the *
+      * Stored checksum as an int, or None if there aren't two uppercase hex digits after the *
+    """
+    # Take the last $ which has an asterisk after it, then the first asterisk after that $
+    j=line.rfind("*")
+    if j<0:
+        return None
+    i=line.rfind("$",0,j)
+    if i<0:
+        return None
+    j=line.find("*",i)
+    cksum=line[j+1:j+3]
+    if len(cksum)==2 and cksum[0] in nmea_hex and cksum[1] in nmea_hex:
+        return line[i+1:j],int(cksum,16)
+    return line[i+1:j],None
+
+
 re_gga=re.compile(r"""
 (?P<gpstype>..)GGA,  #Type of GPS system
 (?P<time>[0-9]{6}(?:\.[0-9]+)?),               #Time, with optional fraction of second
@@ -44,7 +69,7 @@ re_gga=re.compile(r"""
 (?P<alt>-?[0-9]+.[0-9]+)?,(?P<altUnit>[M])?,      #(Optional) altitude and units
 (?P<geoid>-?[0-9]+.[0-9]+)?,(?P<geoidUnit>[M])?,  #(Optional) geoid altitude above ellipsoid and units
 (?P<DGPStime>[^,]*),(?P<DGPSsta>.*) #Slots for DGPS update time and station number
-""",re.VERBOSE)
+""",re.VERBOSE|re.ASCII)
 re_rmb=re.compile(r"""
 (?P<gpstype>..)RMB,  #Type of GPS system
 (?P<valid>[AV])?,                             #Data valid
@@ -58,13 +83,13 @@ re_rmb=re.compile(r"""
 (?P<vmg>[0-9]+.[0-9]+),                       #speed towards the destination, knots
 (?P<alt>-?[0-9]+.[0-9]+)?,(?P<altUnit>[M])?,  #(Optional) altitude and units
 (?P<arrive>[AV])?                             #Arrival alarm
-""",re.VERBOSE)
+""",re.VERBOSE|re.ASCII)
 re_wpl=re.compile(r"""
 (?P<gpstype>..)WPL,                           #Type of GPS system
 (?P<lat>[0-9]{4}\.[0-9]+),(?P<NS>[NS]),       #Latitude and hemisphere
 (?P<lon>[0-9]{5}\.[0-9]+),(?P<EW>[EW]),       #Longitude and hemisphere
 (?P<name>\S+)                                 #waypoint name
-""",re.VERBOSE)
+""",re.VERBOSE|re.ASCII)
 re_rmc=re.compile(r"""
 (?P<gpstype>..)RMC,  #Type of GPS system
 (?P<time>[0-9]{6}(?:\.[0-9]+)?),               #Time, with optional fraction of second
@@ -75,7 +100,7 @@ re_rmc=re.compile(r"""
 (?P<hdg>[0-9]+.[0-9]+)?,                     #(Optional) true heading
 (?P<date>[0-9]{6}),                          #Date in DDMMYY
 (?P<magvar>[0-9]+\.[0-9]+)?,(?P<magvarDir>[EW])?      #(optional) magnetic variation
-""",re.VERBOSE)
+""",re.VERBOSE|re.ASCII)
 re_pkwne=re.compile(r"""
 PKWNE,
 (?P<timestamp>[0-9]+),                       #Sensor timestamp
@@ -83,18 +108,17 @@ PKWNE,
 (?P<minute>[0-9]{2}):                          #Minute
 (?P<second>[0-9]{2}(?:\.[0-9]+)?),             #Second with optional fractional part
 (?P<tag>.*)                                  #Event tag
-""",re.VERBOSE)
+""",re.VERBOSE|re.ASCII)
 
 
 def get_lat(latin, hemi):
-    lat = float(latin)
-    latdeg = int(lat) // 100
-    min = lat - latdeg * 100
-    lat = latdeg + min / 60
+    # Input is DDMM.mmmm (or DDDMM.mmmm for longitude), so split the degrees
+    # and minutes on the string rather than doing it in floating point.
+    dot = latin.index('.')
+    lat = int(latin[:dot-2]) + float(latin[dot-2:]) / 60
     if hemi == "S" or hemi == "W":
         lat = -lat
-    lat=np.deg2rad(lat)
-    return lat
+    return math.radians(lat)
 
 
 def sod(timein):
@@ -104,14 +128,17 @@ def sod(timein):
     return h * 3600 + m * 60 + s
 
 
+# lla2xyz() and dist() are called once per fix on scalars, so they use the math
+# module. Numpy ufuncs spend far longer dispatching on a scalar than doing the math.
 def lla2xyz(lat_deg:float=None, lon_deg:float=None, lat_rad:float=None,lon_rad:float=None):
     if lat_rad is None:
-        lat_rad=np.deg2rad(lat_deg)
+        lat_rad=math.radians(lat_deg)
     if lon_rad is None:
-        lon_rad=np.deg2rad(lon_deg)
-    return (np.cos(lat_rad) * np.cos(lon_rad),
-            np.cos(lat_rad) * np.sin(lon_rad),
-            np.sin(lat_rad))
+        lon_rad=math.radians(lon_deg)
+    coslat=math.cos(lat_rad)
+    return (coslat * math.cos(lon_rad),
+            coslat * math.sin(lon_rad),
+            math.sin(lat_rad))
 
 
 def dotp(a, b):
@@ -128,21 +155,39 @@ def dist(a, b):
     if d < -1:
         print("dot product out of range (negative)")
         return 6378137 * 3.1415926535897932
-    return np.acos(d) * 6378137
+    return math.acos(d) * 6378137
 
 
 def calc_checksum(data):
-    cksum_calc = 0x00
-    for char in data:
-        cksum_calc = cksum_calc ^ ord(char)
-    return cksum_calc
+    if not data.isascii():
+        # Code points, not bytes, so this won't match a stored checksum. Keep
+        # the loop so the result is the same as it always was.
+        cksum_calc = 0x00
+        for char in data:
+            cksum_calc = cksum_calc ^ ord(char)
+        return cksum_calc
+    # Treat the sentence as one big int and fold it onto itself, halving the
+    # distance each time, until the low byte is the XOR of every byte.
+    n = len(data)
+    cksum_calc = int.from_bytes(data.encode('ascii'), 'little')
+    width = 1
+    while width < n:
+        cksum_calc ^= cksum_calc >> (width << 3)
+        width <<= 1
+    return cksum_calc & 0xff
 
 
 def parse(infn)->Track:
-    old_lat = None
-    old_lon = None
+    # Unit vector of the last accepted fix, so that it isn't recalculated for every new fix
+    old_xyz = None
+    # Times are kept as float seconds, counting from midnight of the first date in the
+    # file so they stay small enough to difference precisely. They are only turned into
+    # a datetime to use as a track key.
     old_time = None
     old_date = None
+    old_date_str = None
+    old_date_s = None
+    first_ordinal = None
     old_spd = None
     high_alt = None
     high_lineno = None
@@ -156,7 +201,10 @@ def parse(infn)->Track:
     speed=[]
     bad_alt=True
 
-    latlon=Track()
+    # Accepted fixes, only turned into a Track once the whole file has been read
+    fix_times=[]
+    fix_lats=[]
+    fix_lons=[]
 
     def handle_gga(gga_match):
         """
@@ -164,24 +212,25 @@ def parse(infn)->Track:
         :param gga_match:
         :return:
         """
-        nonlocal latlon,old_lat,old_lon,old_time,old_date,old_spd,bad_alt,lineno,high_alt,high_lineno
+        nonlocal old_xyz,old_time,old_date,old_spd,bad_alt,lineno,high_alt,high_lineno
         if old_date is None:
             print("No date information yet -- No RMC sentence yet?")
             return False
-        lat = get_lat(gga_match.group('lat'), gga_match.group('NS'))
-        lon = get_lat(gga_match.group('lon'), gga_match.group('EW'))
-        time = sod(gga_match.group('time'))
-        time=old_date+datetime.timedelta(seconds=time)
-        alt = gga_match.group('alt')
-        geoid = gga_match.group('geoid')
+        # One group() call for all the fields, rather than one lookup per field
+        lat_s,ns,lon_s,ew,time_s,alt,geoid = gga_match.group('lat','NS','lon','EW','time','alt','geoid')
+        lat = get_lat(lat_s, ns)
+        lon = get_lat(lon_s, ew)
+        time_of_day = sod(time_s)
+        time = old_date_s + time_of_day
         bad_alt = (alt == "-" + geoid) or ("-" + alt == geoid)
         if bad_alt:
             print("Bad altitude on line ", lineno, data)
             return False
-        if old_lat is not None:
+        xyz = lla2xyz(lat, lon)
+        if old_xyz is not None:
             dt = time - old_time
-            dd = dist(lla2xyz(lat, lon), lla2xyz(old_lat, old_lon))
-            if dt.total_seconds() == 0:
+            dd = dist(xyz, old_xyz)
+            if dt == 0:
                 if dd > 10:
                     print("Position step on line ", lineno)
                     return False
@@ -189,48 +238,54 @@ def parse(infn)->Track:
                     spd = 0
                     acc = 0
             else:
-                spd = dd / dt.total_seconds()
-                acc = (spd - old_spd) / dt.total_seconds()
+                spd = dd / dt
+                acc = (spd - old_spd) / dt
             speed.append(spd)
             if abs(acc) > 999:
                 print("Position glitch (acc=%f) on line %d %s"%(acc,lineno, data))
                 return False
             else:
-                old_lat = lat
-                old_lon = lon
+                old_xyz = xyz
                 old_time = time
                 old_spd = spd
                 if high_alt is not None and alt>high_alt:
                     high_alt=alt
                     high_lineno=lineno
         else:
-            old_lat = lat
-            old_lon = lon
+            old_xyz = xyz
             old_time = time
             old_spd = 0
             if alt is not None:
                 high_alt = alt
                 high_lineno = lineno
-        latlon[time]=(lat,lon)
+        fix_times.append(old_date+datetime.timedelta(seconds=time_of_day))
+        fix_lats.append(lat)
+        fix_lons.append(lon)
         return True
 
     def handle_rmc(rmc_match):
-        nonlocal old_lat,old_lon,old_time,old_date,old_spd,lineno,high_alt,high_lineno,printlat,printlon
-        printlat=rmc_match.group('lat')+","+rmc_match.group("NS")
-        printlon=rmc_match.group('lon')+","+rmc_match.group("EW")
-        lat = get_lat(rmc_match.group('lat'), rmc_match.group('NS'))
-        lon = get_lat(rmc_match.group('lon'), rmc_match.group('EW'))
-        time = sod(rmc_match.group('time'))
-        date=datetime.datetime(year=int(rmc_match.group("date")[4:6]),
-                               month=int(rmc_match.group("date")[2:4]),
-                               day=int(rmc_match.group("date")[0:2]),
-                               tzinfo=pytz.timezone('UTC'))
-        old_date=date
-        time=date+datetime.timedelta(seconds=time)
-        if old_lat is not None:
+        nonlocal old_xyz,old_time,old_date,old_date_str,old_date_s,first_ordinal,old_spd,lineno,high_alt,high_lineno,printlat,printlon
+        lat_s,ns,lon_s,ew,time_s,date_str=rmc_match.group('lat','NS','lon','EW','time','date')
+        printlat=lat_s+","+ns
+        printlon=lon_s+","+ew
+        lat = get_lat(lat_s, ns)
+        lon = get_lat(lon_s, ew)
+        time_of_day = sod(time_s)
+        if date_str!=old_date_str:
+            old_date=datetime.datetime(year=int(date_str[4:6]),
+                                       month=int(date_str[2:4]),
+                                       day=int(date_str[0:2]),
+                                       tzinfo=datetime.timezone.utc)
+            old_date_str=date_str
+            if first_ordinal is None:
+                first_ordinal=old_date.toordinal()
+            old_date_s=(old_date.toordinal()-first_ordinal)*86400
+        time = old_date_s + time_of_day
+        xyz = lla2xyz(lat, lon)
+        if old_xyz is not None:
             dt = time - old_time
-            dd = dist(lla2xyz(lat, lon), lla2xyz(old_lat, old_lon))
-            if dt.total_seconds() == 0:
+            dd = dist(xyz, old_xyz)
+            if dt == 0:
                 if dd > 0:
 #                    print("Position step on line ", lineno)
                     return False
@@ -238,33 +293,29 @@ def parse(infn)->Track:
                     spd = 0
                     acc = 0
             else:
-                spd = dd / dt.total_seconds()
-                acc = (spd - old_spd) / dt.total_seconds()
+                spd = dd / dt
+                acc = (spd - old_spd) / dt
             speed.append(spd)
             if abs(acc) > 999:
 #                print("Position glitch on line ", lineno, data)
                 return False
             else:
-                old_lat = lat
-                old_lon = lon
+                old_xyz = xyz
                 old_time = time
                 old_spd = spd
         else:
-            old_lat = lat
-            old_lon = lon
+            old_xyz = xyz
             old_time = time
             old_spd = 0
-        latlon[time]=(lat,lon)
+        fix_times.append(old_date+datetime.timedelta(seconds=time_of_day))
+        fix_lats.append(lat)
+        fix_lons.append(lon)
         return True
 
     def handle_wpl(match):
         nonlocal wpl_dict
-        lat=match.group('lat')
-        ns=match.group('NS')
-        lon = match.group('lon')
-        ew=match.group('EW')
-        name=match.group('name')
-        if match.group('name') not in wpl_dict:
+        lat,ns,lon,ew,name=match.group('lat','NS','lon','EW','name')
+        if name not in wpl_dict:
             print("Found waypoint %s at (%s%s,%s%s)"%(name,lat,ns,lon,ew))
             wpl_dict[name]=(lat,ns,lon,ew)
             return True
@@ -288,46 +339,50 @@ def parse(infn)->Track:
         for line in inf:
             if lineno == 123116:
                 print("break!")
-            result=re_nmea.match(line)
+            result=split_nmea(line)
             if result is not None:
-                data=result.group(1)
-                cksum_stored=result.group(2)
-                cksum_calc=calc_checksum(data)
-                if cksum_stored is None or int("0x"+cksum_stored,16)==cksum_calc:
+                data,cksum_stored=result
+                if cksum_stored is None or cksum_stored==calc_checksum(data):
                     data_valid=True
-                    gga_match = re_gga.match(data)
-                    if gga_match is not None:
-                        if not handle_gga(gga_match):
+                    # Each sentence regex can only match its own sentence type, so
+                    # pick the one regex to try from the type.
+                    stype=data[2:5]
+                    head=data[0:5]
+                    if stype=="GGA":
+                        gga_match = re_gga.match(data)
+                        if gga_match is None:
+                            #print("Bad GGA at line ",lineno,data)
+                            data_valid=False
+                        elif not handle_gga(gga_match):
                             data_valid=False
                         else:
                             npos+=1
-                    elif data[2:5]=="GGA":
-                        #print("Bad GGA at line ",lineno,data)
-                        data_valid=False
-                    rmc_match = re_rmc.match(data)
-                    if rmc_match is not None:
-                        data_valid=not bad_alt
-                        if not handle_rmc(rmc_match):
+                    elif stype=="RMC":
+                        rmc_match = re_rmc.match(data)
+                        if rmc_match is None:
+                            #print("Bad RMC at line ",lineno,data)
                             data_valid=False
                         else:
-                            npos+=1
-                    elif data[2:5]=="RMC":
-                        #print("Bad RMC at line ",lineno,data)
-                        data_valid=False
-                    wpl_match = re_wpl.match(data)
-                    if wpl_match is not None:
-                        if not handle_wpl(wpl_match):
+                            data_valid=not bad_alt
+                            if not handle_rmc(rmc_match):
+                                data_valid=False
+                            else:
+                                npos+=1
+                    elif stype=="WPL":
+                        wpl_match = re_wpl.match(data)
+                        if wpl_match is None:
+                            print("Bad WPL at line ",lineno,data)
+                            data_valid=False
+                        elif not handle_wpl(wpl_match):
                             data_valid=False
-                    elif data[2:5]=="WPL":
-                        print("Bad WPL at line ",lineno,data)
-                        data_valid=False
-                    pkwne_match = re_pkwne.match(data)
-                    if pkwne_match is not None:
-                        data=handle_pkwne(pkwne_match)
-                    elif data[0:5]=="PKWNE":
-                        print("Bad PKWNE at line ",lineno,data)
-                        data_valid=False
-                    if data[0:4]=="PKWN" and data[4]!="E":
+                    elif head=="PKWNE":
+                        pkwne_match = re_pkwne.match(data)
+                        if pkwne_match is None:
+                            print("Bad PKWNE at line ",lineno,data)
+                            data_valid=False
+                        else:
+                            data=handle_pkwne(pkwne_match)
+                    if head.startswith("PKWN") and head!="PKWNE":
                         data_valid=False #PKWN data is probably valid, but Google Earth doesn't care
                     if data_valid:
                         data="GP"+data[2:]
@@ -341,7 +396,7 @@ def parse(infn)->Track:
         pass
         #os.remove(infn)
         #os.remove(oufn)
-    return latlon
+    return Track(times=fix_times,lats_rad=fix_lats,lons_rad=fix_lons)
 
 if __name__=="__main__":
     import glob
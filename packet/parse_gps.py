@@ -6,14 +6,20 @@ import struct
 import traceback
 import bz2
 import gzip
+import io
 
-from struct import unpack
 from enum import Enum
 from .bin import dump_bin
 from packet.rtcm.parse_rtcm import parse_rtcm
 from .parse_ublox import parse_ublox, print_ublox
 
 
+_UBX_LEN=struct.Struct('<H')
+_RTCM_LEN=struct.Struct('>H')
+_BRACE=0x7b   # ord('{')
+_DOLLAR=0x24  # ord('$')
+
+
 class PacketType(Enum):
     """
     Enumeration for packet types
@@ -56,6 +62,28 @@ def rtcm_ck_valid(packet:bytes):
     return True
 
 
+def read_until(inf,delim:bytes)->bytes:
+    """
+    Read from a stream up to and including the next occurrence of a single-byte delimiter.
+    This scans whatever the stream already has buffered with bytes.find(), rather than
+    reading one byte at a time.
+
+    :param inf: Buffered binary stream supporting peek(), like io.BufferedReader,
+                bz2.BZ2File, or gzip.GzipFile
+    :param delim: Delimiter byte
+    :return: Bytes read, ending with delim unless the stream hit EOF first
+    """
+    result=b''
+    while True:
+        buf=inf.peek(1)
+        if len(buf)==0:
+            return result
+        i=buf.find(delim)
+        if i>=0:
+            return result+inf.read(i+1)
+        result+=inf.read(len(buf))
+
+
 def next_packet(inf,reject_invalid=True,nmea_max=None):
     """
     Get the next packet from a binary stream
@@ -71,28 +99,27 @@ def next_packet(inf,reject_invalid=True,nmea_max=None):
     if len(header_peek)<1:
         #Not enough data to read even one byte of next packet (EOF at end of packet)
         return None,None
-    if header_peek[0]==ord('{'):
+    b0=header_peek[0]
+    if b0==_BRACE:
         #Looks like JSON, read until the 0D0A
-        result=header_peek
-        while result[-1]!=0x0A:
-            result+=inf.read(1)
+        result=header_peek+inf.readline()
         return PacketType.JSON,str(result,encoding='cp437')
-    if header_peek[0]==ord('$'):
+    if b0==_DOLLAR:
         #Looks like an NMEA packet, read until the asterisk
-        result=header_peek
-        while result[-1]!=ord('*'):
-            result+=inf.read(1)
-        #Read either 0D0A or checksum
-        result+=inf.read(2)
-        has_checksum=False
-        if not (result[0]==0x0d and result[1]==0x0a):
-            result+=inf.read(2)
-            has_checksum=True
+        result=header_peek+read_until(inf,b'*')
+        #Read either 0D0A or checksum and 0D0A. Read exactly those bytes rather than up
+        #to the next 0A, so a sentence with a damaged line ending can't swallow the
+        #binary packets after it.
+        tail=inf.read(2)
+        has_checksum=tail!=b'\r\n'
+        if has_checksum:
+            tail+=inf.read(2)
+        result+=tail
         if not reject_invalid or nmea_ck_valid(result,has_checksum):
             return PacketType.NMEA, str(result,encoding='cp437').strip()
         else:
             return None, None
-    elif header_peek[0]==0xb5:
+    elif b0==0xb5:
         #Start of UBlox header
         header=header_peek+inf.read(1)
         if header[1]==0x62:
@@ -100,7 +127,7 @@ def next_packet(inf,reject_invalid=True,nmea_max=None):
             header=header+inf.read(4)
             cls=header[2]
             id=header[3]
-            length=unpack('<H',header[4:6])[0]
+            length=_UBX_LEN.unpack_from(header,4)[0]
             payload=inf.read(length)
             if len(payload)<length:
                 #Incomplete packet (IE chopped off by EOF)
@@ -119,12 +146,12 @@ def next_packet(inf,reject_invalid=True,nmea_max=None):
             #the stream has been advanced by two bytes. If there is a stray 0xb5 (mu) before
             #an actual packet, this will cause the packet to be missed.
             return None,None
-    elif header_peek[0]==0xd3:
+    elif b0==0xd3:
         # Start of RTCM packet. One byte preamble, two-byte big-endian length (only 10 ls bits
         # are significant), n-byte payload, three byte CRC
         #Start of UBlox header
         header=header_peek+inf.read(2)
-        length=unpack('>H',header[1:3])[0] & 0x3ff
+        length=_RTCM_LEN.unpack_from(header,1)[0] & 0x3ff
         payload=inf.read(length)
         ck=inf.read(3)
         if not reject_invalid or ublox_ck_valid(payload,ck[0],ck[1]):
@@ -140,11 +167,16 @@ def next_packet(inf,reject_invalid=True,nmea_max=None):
 
 def smart_open(infn:str,mode:str="rb"):
     if ".bz2" in infn:
-        return bz2.open(infn,mode)
+        inf=bz2.open(infn,mode)
     elif ".gz" in infn:
-        return gzip.open(infn,mode)
+        inf=gzip.open(infn,mode)
     else:
-        return open(infn,mode)
+        return open(infn,mode,buffering=1<<20)
+    if "r" in mode and "t" not in mode:
+        # next_packet() makes lots of tiny reads. BZ2File and GzipFile do each one
+        # in Python, while BufferedReader serves them from its buffer in C.
+        return io.BufferedReader(inf,buffer_size=1<<20)
+    return inf
 
 
 def parse_gps_file(infn):
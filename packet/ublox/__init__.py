@@ -11,34 +11,65 @@ import protocol_33_21
 
 Then
 """
-from collections import namedtuple
+from array import array
 from dataclasses import dataclass, fields
-from functools import partial
-from struct import unpack
-from typing import BinaryIO
+from functools import cache, partial
+from operator import mul
+from struct import Struct
+from typing import BinaryIO, Callable
 import re
 
+import numpy as np
+
 from database import Database
-from packet.bin import get_bits
 from packet import read_packet, Packet, ensure_table
 
 
-def fletcher8(buf:bytes):
+@cache
+def fletcher_weights()->np.ndarray:
+    """
+    Weight of each byte in ck_b, for the longest possible packet. The last n
+    elements are n, n-1, ..., 1, which are the weights for an n-byte buffer.
+    This is half a megabyte, and checksums are normally off, so it is only
+    built the first time a long buffer is checksummed.
+    """
+    return np.arange(6+0xffff,0,-1,dtype=np.int64)
+
+
+def fletcher8(*bufs:bytes):
     """
     Calculate the 8-bit Fletcher checksum according to the algorithm in
     section 3.4
-    :param buf: Combined header and payload
+    :param bufs: Header and payload. The checksum is of all of these in order, as
+                 if they were one buffer, but they don't have to be copied into one.
     :return: two-byte buffer with ck_a as element 0 and ck_b as element 1.
              This can be directly compared with the checksum as-read.
     """
     ck_a=0
     ck_b=0
-    for byte in buf:
-        ck_a=(ck_a+byte) & 0xFF
-        ck_b=(ck_b+ck_a) & 0xFF
+    for buf in bufs:
+        if len(buf)<64:
+            # Short enough that numpy's per-call overhead costs more than the loop
+            for byte in buf:
+                ck_a=(ck_a+byte) & 0xFF
+                ck_b=(ck_b+ck_a) & 0xFF
+        else:
+            # ck_a is the sum of all the bytes. ck_b is the sum of all the running values
+            # of ck_a, so for an n-byte buffer it gets the incoming ck_a n times, and byte i
+            # added n-i times. Both are only needed mod 256.
+            a=np.frombuffer(buf,dtype=np.uint8)
+            ck_b=(ck_b+len(a)*ck_a+int(np.dot(a,fletcher_weights()[-len(a):]))) & 0xFF
+            ck_a=(ck_a+int(a.sum())) & 0xFF
     return bytes((ck_a,ck_b))
 
 
+# Class, id, and payload length, which follow the two signature bytes
+_UBX_HDR=Struct('<BBH')
+# Set to True to check the Fletcher checksum of every packet read. The checksum is
+# read either way, so this only costs time when it is on.
+VERIFY_CHECKSUMS=False
+
+
 def read_ublox_packet(header:bytes,inf:BinaryIO):
     """
     Read a ublox packet. This is also a factory function, which reads
@@ -60,26 +91,19 @@ def read_ublox_packet(header:bytes,inf:BinaryIO):
     header4=inf.read(4)
     if len(header4)<4:
         raise EOFError
-    header+=header4
-    cls = header[2]
-    id = header[3]
-    length = unpack('<H', header[4:6])[0]
-    if length==0:
-        payload=bytes()
-    else:
-        payload=inf.read(length)
-        if len(payload)<length:
-            raise EOFError
-    calc_ck=fletcher8(header+payload)
-    read_ck=inf.read(2)
-    if len(read_ck)<2:
+    cls,id,length=_UBX_HDR.unpack(header4)
+    # Payload and checksum in one read
+    tail=inf.read(length+2)
+    if len(tail)<length+2:
         raise EOFError
-    #if read_ck!=calc_ck:
-    #    raise ValueError(f"Checksum doesn't match: Calculated {calc_ck[0]:02x}{calc_ck[1]:02x}, read {read_ck[0]:02x}{read_ck[1]:02x}")
-    if cls in read_ublox_packet.classes and id in read_ublox_packet.classes[cls]:
-        return read_ublox_packet.classes[cls][id](cls,id,payload)
-    else:
-        return UBloxPacket(cls,id,payload)
+    payload=tail[:length]
+    if VERIFY_CHECKSUMS:
+        read_ck=tail[length:]
+        # The checksum covers class, id, length, and payload, but not the signature
+        calc_ck=fletcher8(header4,payload)
+        if read_ck!=calc_ck:
+            raise ValueError(f"Checksum doesn't match: Calculated {calc_ck[0]:02x}{calc_ck[1]:02x}, read {read_ck[0]:02x}{read_ck[1]:02x}")
+    return read_ublox_packet.classes.get((cls<<8)|id,UBloxPacket).acquire(cls,id,payload)
 read_ublox_packet.classes={}
 read_packet.classes[0xb5]=read_ublox_packet
 
@@ -92,23 +116,20 @@ class UBloxPacket(Packet):
     section of a packet.
 
     """
+    __slots__=('cls','id','payload')
     def parse_payload(self,payload:bytes)->None:
         """
-        Parse a ublox packet
+        Parse a ublox packet. Every compiled packet class gets a specialized version of
+        this from codegen(), and this general version is the reference it must agree with.
 
         :param packet: bytes array containting payload of packet, not including header or checksum
         :return: None, but sets fields of self as appropriate
         """
-        def scale_field(value,b1,b0,scale):
-            if b0 is not None:
-                value=get_bits(value,b1=b1,b0=b0)
-            if scale is not None:
-                value=scale(value)
-            return value
         if self.compiled_form.b > 0:
-            unscaled_header = unpack(self.compiled_form.ht, payload[0:self.compiled_form.b])
-            for field_name,i_unpack,b1,b0,scale in zip(self.compiled_form.hn,self.compiled_form.hp,self.compiled_form.h1,self.compiled_form.h0,self.compiled_form.hs):
-                setattr(self, field_name, scale_field(unscaled_header[i_unpack],b1,b0,scale))
+            unscaled_header = self.compiled_form.hS.unpack_from(payload, 0)
+            for field_name,i_unpack,apply in zip(self.compiled_form.hn,self.compiled_form.hp,self.compiled_form.ha):
+                value=unscaled_header[i_unpack]
+                setattr(self, field_name, value if apply is None else apply(value))
         if self.compiled_form.m > 0:
             # The repeating blocks are represented in memory by a list of fields, each long enough to hold
             # one element for each repeat. Following the database convention, we will call the collection
@@ -117,27 +138,31 @@ class UBloxPacket(Packet):
             d = len(payload)
             assert (d - self.compiled_form.b - self.compiled_form.c) % self.compiled_form.m == 0, f"Non-integer number of rows in {self.__class__.__name__}, b={self.compiled_form.b}, c={self.compiled_form.c}, m={self.compiled_form.m}"
             n_rows = (d - self.compiled_form.b - self.compiled_form.c) // self.compiled_form.m
-            n_cols = len(self.compiled_form.bs)
-            # in memory -- the blocks are a tuple of columns, each a list long enough to hold one member
-            # for each row. This means each cell has a double index, the first one being the column index,
-            # second being row. We do it this way so that we can concatenate it with the header and
-            # footer tuple, and hand the combo right off to the _make() method of namedtuple.
-            cols = tuple([[None for x in range(n_rows)] for y in range(n_cols)])
-            for i_row in range(n_rows):
-                row0=self.compiled_form.b + i_row * self.compiled_form.m
-                row1=row0+self.compiled_form.m
-                row_payload=payload[row0:row1]
-                unscaled_row = unpack(self.compiled_form.bt, row_payload)
-                for i_col, (i_unpack, b1, b0, scale) in enumerate(zip(self.compiled_form.bp,self.compiled_form.b1, self.compiled_form.b0,self.compiled_form.bs)):
-                    cols[i_col][i_row]=scale_field(unscaled_row[i_unpack], b1, b0, scale)
-            for i_col,field_name in enumerate(self.compiled_form.bn):
-                setattr(self,field_name,cols[i_col])
+            # Every row has the same format, so unpack them all in C with iter_unpack(), then
+            # transpose the rows into columns with zip(). unscaled_cols[i_unpack] is then every
+            # row's value of that struct member, in row order.
+            i0=self.compiled_form.b
+            i1=i0+n_rows*self.compiled_form.m
+            unscaled_cols = tuple(zip(*self.compiled_form.bS.iter_unpack(memoryview(payload)[i0:i1])))
+            if n_rows==0:
+                unscaled_cols = ((),)*(max(self.compiled_form.bp)+1)
+            # in memory -- each column is a list (or a typed array for plain numbers) long enough
+            # to hold one member for each row.
+            for field_name,i_unpack,apply,typecode in zip(self.compiled_form.bn,self.compiled_form.bp,self.compiled_form.ba,self.compiled_form.bc):
+                col=unscaled_cols[i_unpack]
+                if typecode is not None:
+                    col=array(typecode,col)
+                elif apply is None:
+                    col=list(col)
+                else:
+                    col=list(map(apply,col))
+                setattr(self,field_name,col)
         if self.compiled_form.c > 0:
             i0=self.compiled_form.b + n_rows * self.compiled_form.m
-            i1=i0+self.compiled_form.c
-            unscaled_footer = unpack(self.compiled_form.ft, payload[i0:i1])
-            for field_name,i_unpack,b1,b0,scale in zip(self.compiled_form.fn,self.compiled_form.fp,self.compiled_form.f1,self.compiled_form.f0,self.compiled_form.fs):
-                setattr(self, field_name, scale_field(unscaled_footer[i_unpack],b1,b0,scale))
+            unscaled_footer = self.compiled_form.fS.unpack_from(payload, i0)
+            for field_name,i_unpack,apply in zip(self.compiled_form.fn,self.compiled_form.fp,self.compiled_form.fa):
+                value=unscaled_footer[i_unpack]
+                setattr(self, field_name, value if apply is None else apply(value))
         self.fixup()
     def fixup(self)->None:
         """
@@ -151,6 +176,31 @@ class UBloxPacket(Packet):
         self.payload = payload
         if hasattr(self,'compiled_form'):
             self.parse_payload(payload)
+    # Free list of released instances of this class, or None if the class isn't pooled.
+    # Only packets with no repeating block are pooled, since parse_payload() replaces
+    # every one of their fields, so nothing from the last use can leak through.
+    _pool=None
+    @classmethod
+    def acquire(pktcls,cls:int,id:int,payload:bytes)->'UBloxPacket':
+        """
+        Get a packet of this class parsed from payload, reusing a released instance
+        if there is one.
+        """
+        if pktcls._pool:
+            packet=pktcls._pool.pop()
+            packet.cls=cls
+            packet.id=id
+            packet.payload=payload
+            packet.parse_payload(payload)
+            return packet
+        return pktcls(cls,id,payload)
+    def release(self)->None:
+        """
+        Give this packet back to be reused by acquire(). Only call this when nothing
+        will look at the packet again.
+        """
+        if self._pool is not None:
+            self._pool.append(self)
 
 
 def bin_field(raw_type:str, **kwargs):
@@ -193,10 +243,49 @@ def bin_field(raw_type:str, **kwargs):
 
 
 def register_ublox(cls:int,id:int,pktcls:dataclass)->None:
-    #register the class after it is compiled
-    if cls not in read_ublox_packet.classes:
-        read_ublox_packet.classes[cls]={}
-    read_ublox_packet.classes[cls][id]=pktcls
+    #register the class after it is compiled. Classes are keyed on cls and id together
+    #so that reading a packet only needs one dictionary lookup.
+    read_ublox_packet.classes[(cls<<8)|id]=pktcls
+
+
+re_fmt_width=re.compile(r"( *)[^1-9]*(\d+).*")
+re_fmt_set_width=re.compile(r"(?P<spaces> *)(?P<prefix>[^1-9]*)(?P<sigwidth>\d+)(?P<suffix>.*)")
+
+
+@dataclass(slots=True)
+class CompiledForm:
+    """
+    Layout of a packet class, worked out once by compile_ublox(). Fields which
+    start with ? are present for each of the header (h), repeating block (b),
+    and footer (f).
+    """
+    b:int                       # number of bytes before repeating block
+    m:int                       # number of bytes in repeating block
+    c:int                       # number of bytes after repeating block
+    hn:list[str]                # ?n: field names in order (possibly empty)
+    hS:Struct                   # ?S: struct for the whole part, so the format is only parsed once
+    hp:list[int]                # ?p: index of the struct.unpack result to use for each field
+    h0:list[int|None]           # ?0: bitfield position 0, or None if not a bitfield
+    h1:list[int|None]           # ?1: bitfield position 1, or None if not a bitfield
+    ha:list[Callable|None]      # ?a: callables which do both the bitfield extraction and the scale,
+                                #     or None if the unpacked value is already the field value
+    hq:list[str]                # ?q: names of the fields which are recorded in the database
+    bn:list[str]
+    bS:Struct
+    bp:list[int]
+    b0:list[int|None]
+    b1:list[int|None]
+    ba:list[Callable|None]
+    bq:list[str]
+    fn:list[str]
+    fS:Struct
+    fp:list[int]
+    f0:list[int|None]
+    f1:list[int|None]
+    fa:list[Callable|None]
+    fq:list[str]
+    bc:list[str|None]           # array.array typecode for each block column which holds plain
+                                # numbers, or None if the column should be a list
 
 
 def compile_ublox(pktcls:dataclass)->None:
@@ -205,18 +294,8 @@ def compile_ublox(pktcls:dataclass)->None:
     book to something more usable at runtime
 
     :param pktclass: Dataclass with names annotated with field(...,metadata=md()).
-    :return: named tuple
-      * b: number of bytes before repeating block
-      * m: number of bytes in repeating block
-      * c: number of bytes after repeating block
-      for the following, ? is header, block, or footer
-      * *_fields: iterable of header field names in order (possibly empty)
-      * *_type: string suitable for handing to struct.unpack, for names before repeating block
-      * *_unpack: iterable of index of struct.unpack result to use for this field
-      * *_scale: iterable of lambdas which scale the field for names before repeating block
-      * *_units: iterable units for names before repeating block
-      * *_b0: iterable of bitfield position 0, if this is a bitfield.
-      * *_b1: iterable of bitfield position 1, if this is a bitfield.
+    :return: None, but sets pktcls.compiled_form to a CompiledForm, and
+             pktcls.parse_payload to a version generated for this class
 
     At parse time, the number of repeats of the repeating block is determined as follows:
 
@@ -228,19 +307,29 @@ def compile_ublox(pktcls:dataclass)->None:
     """
 
     def make_scale(scale):
-        if scale is None:
-            return lambda x: x
-        elif callable(scale):
+        if scale is None or callable(scale):
             return scale
         else:
-            return partial(lambda s, x: s * x, scale)
+            return partial(mul, scale)
+
+    def make_apply(b0, b1, scale):
+        # Fold the bitfield extraction and the scale of one field into a single
+        # callable, or None if the raw unpacked value is used as-is. The mask is
+        # computed here, so extraction is one shift and one and per value.
+        if b0 is None:
+            return scale
+        mask=(1<<(b1-b0+1))-1
+        if scale is None:
+            return lambda x: (x>>b0)&mask
+        else:
+            return lambda x: scale((x>>b0)&mask)
 
     def fmt_width(fmt):
-        match = re.match("( *)[^1-9]*(\d+).*", fmt)
+        match = re_fmt_width.match(fmt)
         return len(match.group(1)) + int(match.group(2))
 
     def fmt_set_width(fmt, width):
-        match = re.match("(?P<spaces> *)(?P<prefix>[^1-9]*)(?P<sigwidth>\d+)(?P<suffix>.*)", fmt)
+        match = re_fmt_set_width.match(fmt)
         old_width = int(match.group("sigwidth"))
         if width < old_width:
             return match.group("spaces") + match.group("prefix") + str(width) + match.group("suffix")
@@ -269,6 +358,7 @@ def compile_ublox(pktcls:dataclass)->None:
     widths=[[],[],[]]
     b0s=[[],[],[]]
     b1s=[[],[],[]]
+    typecodes=[[],[],[]]
     record_names=[[],[],[]]
     part=0
     i_struct=0
@@ -300,6 +390,7 @@ def compile_ublox(pktcls:dataclass)->None:
         if 'record' not in field.metadata or field.metadata['record']:
             record_names[part].append(field.name)
         ublox_type=field.metadata['type']
+        typecodes[part].append(None)
         if 'b0' in field.metadata:
             # Handle bitfields
             if (ublox_type==last_x) and (last_b1 is not None) and (field.metadata['b0']>last_b1):
@@ -327,11 +418,11 @@ def compile_ublox(pktcls:dataclass)->None:
                 #handle numbers
                 types[part] += size_dict[ublox_type][0]
                 lengths[part] += size_dict[ublox_type][1]
+                typecodes[part][-1]=size_dict[ublox_type][0]
             b0s[part].append(None)
             b1s[part].append(None)
             last_x=None
         unpacks[part].append(i_struct)
-        print(i_struct,lengths[part],field.name)
         i_struct+=1
         if 'scale' in field.metadata:
             scales[part].append(make_scale(field.metadata['scale']))
@@ -352,40 +443,96 @@ def compile_ublox(pktcls:dataclass)->None:
         #fmts[part].append(fmt)
         #widths[part].append(fmt_width(fmt))
     b,m,c=lengths
-    header_fields,block_fields,footer_fields=names
-    header_types,block_types,footer_types=["<"+x for x in types]
-    header_scale,block_scale,footer_scale=scales
-    header_units,block_units,footer_units=units
-    header_format,block_format,footer_format=fmts
-    header_widths,block_widths,footer_widths=widths
-    header_b0,block_b0,footer_b0=b0s
-    header_b1,block_b1,footer_b1=b1s
-    header_unpack,block_unpack,footer_unpack=unpacks
-    header_records,block_records,footer_records=record_names
-    pktcls.compiled_form=namedtuple("packet_desc","b m c hn ht hs hu hf hw h0 h1 hp hq bn bt bs bu bf bw b0 b1 bp bq fn ft fs fu ff fw f0 f1 fp fq")._make((b,m,c,
-            header_fields,header_types,header_scale,header_units,header_format,header_widths,header_b0,header_b1,header_unpack,header_records,
-            block_fields,block_types,block_scale,block_units,block_format,block_widths,block_b0,block_b1,block_unpack,block_records,
-            footer_fields, footer_types, footer_scale, footer_units, footer_format,footer_widths,footer_b0,footer_b1,footer_unpack,footer_records))
+    structs=[Struct("<"+x) for x in types]
+    applies=[[make_apply(b0,b1,scale) for b0,b1,scale in zip(*x)] for x in zip(b0s,b1s,scales)]
+    # Block columns which are plain numbers with no bitfield or scale can be stored as a typed
+    # array.array instead of a list of boxed Python numbers.
+    block_typecodes=[typecode if apply is None else None for typecode,apply in zip(typecodes[1],applies[1])]
+    pktcls.compiled_form=CompiledForm(b=b,m=m,c=c,
+            hn=names[0],hS=structs[0],hp=unpacks[0],h0=b0s[0],h1=b1s[0],ha=applies[0],hq=record_names[0],
+            bn=names[1],bS=structs[1],bp=unpacks[1],b0=b0s[1],b1=b1s[1],ba=applies[1],bq=record_names[1],
+            fn=names[2],fS=structs[2],fp=unpacks[2],f0=b0s[2],f1=b1s[2],fa=applies[2],fq=record_names[2],
+            bc=block_typecodes)
+    codegen(pktcls)
+
+
+def codegen(pktcls:dataclass)->None:
+    """
+    Generate a specialized parse_payload for a packet class from its compiled_form.
+    Struct indexes, bitfield shifts and masks, and numeric scales are written into the
+    code as constants, so each field is a straight line store with no loop over the
+    compiled_form lists and no branching on the kind of field. The general
+    UBloxPacket.parse_payload() is the reference this must agree with.
+    """
+    cf=pktcls.compiled_form
+    metadata={field.name:field.metadata for field in fields(pktcls)}
+    ns={"hS":cf.hS,"bS":cf.bS,"fS":cf.fS,"array":array}
+    def value_expr(name,raw,b0,b1):
+        if b0 is not None:
+            raw=f"(({raw}>>{b0})&{(1<<(b1-b0+1))-1:#x})"
+        scale=metadata[name].get('scale',None)
+        if scale is None:
+            return raw
+        ns[f"scale_{name}"]=scale
+        if callable(scale):
+            return f"scale_{name}({raw})"
+        return f"scale_{name}*{raw}"
+    lines=["def parse_payload(self,payload):"]
+    if cf.b>0:
+        lines.append("    "+",".join(f"h{i}" for i in range(max(cf.hp)+1))+",=hS.unpack_from(payload,0)")
+        for name,i,b0,b1 in zip(cf.hn,cf.hp,cf.h0,cf.h1):
+            lines.append(f"    self.{name}={value_expr(name,f'h{i}',b0,b1)}")
+    if cf.m>0:
+        msg=f"Non-integer number of rows in {pktcls.__name__}, b={cf.b}, c={cf.c}, m={cf.m}"
+        lines.append(f"    d=len(payload)-{cf.b+cf.c}")
+        lines.append(f"    assert d%{cf.m}==0, {msg!r}")
+        lines.append(f"    n_rows=d//{cf.m}")
+        lines.append(f"    if n_rows>0:")
+        lines.append(f"        cols=tuple(zip(*bS.iter_unpack(memoryview(payload)[{cf.b}:{cf.b}+n_rows*{cf.m}])))")
+        lines.append(f"    else:")
+        lines.append(f"        cols=((),)*{max(cf.bp)+1}")
+        for name,i,b0,b1,typecode in zip(cf.bn,cf.bp,cf.b0,cf.b1,cf.bc):
+            value=value_expr(name,"x",b0,b1)
+            if typecode is not None:
+                col=f"array({typecode!r},cols[{i}])"
+            elif value=="x":
+                col=f"list(cols[{i}])"
+            elif value==f"scale_{name}(x)":
+                col=f"list(map(scale_{name},cols[{i}]))"
+            else:
+                col=f"[{value} for x in cols[{i}]]"
+            lines.append(f"    self.{name}={col}")
+    if cf.c>0:
+        lines.append("    "+",".join(f"f{i}" for i in range(max(cf.fp)+1))+f",=fS.unpack_from(payload,{cf.b}+n_rows*{cf.m})")
+        for name,i,b0,b1 in zip(cf.fn,cf.fp,cf.f0,cf.f1):
+            lines.append(f"    self.{name}={value_expr(name,f'f{i}',b0,b1)}")
+    lines.append("    self.fixup()")
+    # Values for Packet.write(), with each attribute access written out
+    lines.append("def parent_values(self)->list:")
+    lines.append("    return ["+",".join([f"self.{name}" for name in cf.hq+cf.fq])+"]")
+    exec("\n".join(lines),ns)
+    pktcls.parse_payload=ns["parse_payload"]
+    pktcls.parent_values=ns["parent_values"]
 
 
 def ublox_packet(cls:int,id:int,*,use_epoch:bool=True,required_version:int=None):
     def inner(pktcls):
-        __class__=pktcls
-        def __init__(self, cls: int, id: int, payload: int):
-            super().__init__(cls, id, payload)
-        pktcls.__init__=__init__
-        pktcls=dataclass(pktcls)
+        # UBloxPacket.__init__() is the constructor for every packet class, so don't
+        # let dataclass write one. With slots=True dataclass replaces the class with a
+        # new one, so fixup() methods must name UBloxPacket explicitly instead of using super().
+        pktcls=dataclass(pktcls,init=False,slots=True)
         pktcls.use_epoch=use_epoch
         pktcls.required_version=required_version
         compile_ublox(pktcls)
+        if pktcls.compiled_form.m==0:
+            pktcls._pool=[]
         register_ublox(cls,id,pktcls)
         return pktcls
     return inner
 
 
 def ensure_tables(db:Database,drop:bool=False):
-    for cls,ids in read_ublox_packet.classes.items():
-        for id,packet in ids.items():
-            ensure_table(db, packet, drop=drop)
+    for packet in read_ublox_packet.classes.values():
+        ensure_table(db, packet, drop=drop)
 
 
@@ -261,7 +261,7 @@ class UBX_NAV_HPPOSECEF(UBloxPacket):
     validEcef    :bool     =field(metadata=bin_field("X1",b0=0,scale=lambda x:not bool(x)))
     pAcc         :Decimal  =field(metadata=bin_field("U4", unit="m", scale=Decimal('1e-4'), fmt="%10.2f", comment="Position Accuracy Estimate"))
     def fixup(self):
-        super().fixup()
+        UBloxPacket.fixup(self)
         self.ecefX+=self.ecefXHp
         self.ecefY+=self.ecefYHp
         self.ecefZ+=self.ecefZHp
@@ -286,7 +286,7 @@ class UBX_NAV_HPPOSLLH(UBloxPacket):
     hAcc         :Decimal  =field(metadata=bin_field("U4", unit="m", scale=Decimal('1e-4'), fmt="%10.2f", comment="Horizontal Accuracy Estimate"))
     vAcc         :Decimal  =field(metadata=bin_field("U4", unit="m", scale=Decimal('1e-4'), fmt="%10.2f", comment="Vertical Accuracy Estimate"))
     def fixup(self):
-        super().fixup()
+        UBloxPacket.fixup(self)
         self.lon+=self.lonHp
         self.lat+=self.latHp
         self.height+=self.heightHp
@@ -396,7 +396,7 @@ class UBX_NAV_PVT(UBloxPacket):
     magDec       :Decimal  =field(metadata=bin_field("I2",scale=Decimal('1e-2'),unit="deg",fmt="%8.5f",comment="Magnetic declination"))
     magAcc       :Decimal  =field(metadata=bin_field("I2",scale=Decimal('1e-2'),unit="deg",fmt="%8.5f",comment="Magnetic declination accuracy"))
     def fixup(self):
-        super().fixup()
+        UBloxPacket.fixup(self)
         # Example: nano=-0.123_456_789
         # timestamp will have microsecond 876544 (1,000,000-123456) and
         # nano will be -789e-9, so 789 nanoseconds before timestamp.
@@ -614,7 +614,7 @@ class UBX_NAV_SIG(UBloxPacket):
     doCorrUsed:list[bool]   =field(metadata=bin_field("X2", scale=bool,b0=8,comment="Range rate (Doppler) corrections have been used for this signal"),default_factory=list)
     reserved1 :list[int]    =field(metadata=bin_field("X4",record=False),default_factory=list)
     def fixup(self):
-        super().fixup()
+        UBloxPacket.fixup(self)
         self.sigId=[SIGID.get_sigid(gnssId,sigId) for gnssId,sigId in zip(self.gnssId,self.sigId)]
 
 
@@ -704,7 +704,7 @@ an accuracy estimate."""
     validUTC     :bool     =field(metadata=bin_field("X1",b0=2,scale=bool))
     utcStandard  :UTCSTD   =field(metadata=bin_field("X1",b1=7,b0=4,scale=UTCSTD))
     def fixup(self):
-        super().fixup()
+        UBloxPacket.fixup(self)
         # Example: nano=-0.123_456_789
         # timestamp will have microsecond 876544 (1,000,000-123456) and
         # nano will be -789e-9, so 789 nanoseconds before timestamp.
@@ -826,7 +826,7 @@ class UBX_ESF_MEAS(UBloxPacket):
     dataType      :list[SENSORTYPE]=field(metadata=bin_field("U4",b1=29,b0=24,scale=SENSORTYPE))
     calibTtag     :Decimal      =field(metadata=bin_field("U4",scale=Decimal('1e-3')))
     def fixup(self):
-        super().fixup()
+        UBloxPacket.fixup(self)
         for i in range(len(self.data)):
             if sensorUnitsScale[self.dataType[i]][1] is not None:
                 self.data[i]=self.data[i]*sensorUnitsScale[self.dataType[i]][1]
@@ -918,7 +918,7 @@ class UBX_RXM_SFRBX(UBloxPacket):
     reserved0      :int         =field(metadata=bin_field("U1",record=False))
     dwrd           :list[int]   =field(metadata=bin_field("U4"))
     def fixup(self):
-        super().fixup()
+        UBloxPacket.fixup(self)
         self.sigId=SIGID.get_sigid(self.gnssId, self.sigId)
 
 
@@ -977,7 +977,7 @@ leap seconds are known."""))
     subHalfCyc     :list[bool]   =field(metadata=bin_field("U1",b0=3,scale=bool))
     reserved1      :list[int]   =field(metadata=bin_field("U1",record=False))
     def fixup(self):
-        super().fixup()
+        UBloxPacket.fixup(self)
         self.sigId=[SIGID.get_sigid(gnssId,sigId) for gnssId,sigId in zip(self.gnssId,self.sigId)]
 
 
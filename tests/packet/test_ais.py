@@ -1,9 +1,16 @@
 """
 
 """
+import math
+from dataclasses import field
+from enum import Enum
+
+import numpy as np
 import pytest
 
-from packet.ais import get_bitfield
+from packet import Packet
+from packet.ais import aismsg, dearmor_batch, dearmor_payload, get_bitfield, md, msg5_cached, parse_aivdm, parse_aivdm_batch, parse_payload, parse_posA_batch, \
+    signed, u, wraparound_delta, wraparound_delta_vec
 
 
 @pytest.mark.parametrize(
@@ -18,3 +25,138 @@ from packet.ais import get_bitfield
 )
 def test_get_bitfield(nbits,payload,start,field_len,expected):
     assert get_bitfield(nbits,payload,start,field_len)==expected
+
+
+@pytest.mark.parametrize(
+    "payload,shift,expected",
+    [
+        ("0",0,(6,0)),
+        ("w",0,(6,0b111111)),
+        ("1W",2,(10,0b0000011001)),
+        ("13u?",0,(24,0b000001000011111101001111)),
+        ("",0,(0,0)),
+    ]
+)
+def test_dearmor_payload(payload,shift,expected):
+    assert dearmor_payload(payload,shift)==expected
+
+
+@pytest.mark.parametrize(
+    "nbits,val,exp",
+    [(32,0xffffffff,-1)]
+)
+def test_signed(nbits,val,exp):
+    assert signed(nbits,val)==exp
+
+
+def test_wraparound_delta():
+    a=np.array([10,50,59, 0])
+    b=np.array([20,10, 0,59])
+    exp=[10,20, 1,59]
+    assert [wraparound_delta(x,y,60) for x,y in zip(a,b)]==exp
+    assert list(wraparound_delta_vec(a,b,60))==exp
+
+
+@pytest.mark.parametrize(
+    "frags",
+    [
+        ('!AIVDM,2,1,3,B,55P5TL01VIaAL@7WKO@mBplU@<PDhh000000001S;AJ::4A80?4i@E53,0',
+         '!AIVDM,2,2,3,B,1@0000000000000,2'),
+        ('!AIVDM,2,2,4,B,1@0000000000000,2',
+         '!AIVDM,2,1,4,B,55P5TL01VIaAL@7WKO@mBplU@<PDhh000000001S;AJ::4A80?4i@E53,0'),
+    ]
+)
+def test_parse_aivdm_frags(frags):
+    assert parse_aivdm(frags[0]) is None
+    msg=parse_aivdm(frags[1])
+    assert msg.mmsi==369190000
+    assert msg.shipname=="MT.MITCHELL"
+    assert msg.dest=="SEATTLE"
+
+
+class FakeDB:
+    """
+    Just enough of Database for Packet.write(). The table is empty as far as
+    cache_has_old_value() can tell, and inserts are counted.
+    """
+    def __init__(self):
+        self.inserts=0
+        self._cur=self
+    def execute(self,sql,values=None):
+        pass
+    def fetchone(self):
+        return None
+    def insert_get_id(self,table_name,field_names,values):
+        self.inserts+=1
+        return self.inserts
+
+
+def test_msg5_cache():
+    payload='55P5TL01VIaAL@7WKO@mBplU@<PDhh000000001S;AJ::4A80?4i@E531@0000000000000'
+    msg=parse_payload(payload,2)
+    # Decoding alone doesn't record anything, since the message might never be written
+    parse_payload(payload,2)
+    assert msg5_cached(msg.mmsi) is None
+    db=FakeDB()
+    msg.write(db,fileid=1,ofs=0)
+    assert db.inserts==1
+    row=msg5_cached(msg.mmsi)
+    assert row["shipname"]==b"MT.MITCHELL"
+    assert row["draft"]==pytest.approx(msg.draft)
+    parse_payload(payload,2).write(db,fileid=1,ofs=1)
+    assert db.inserts==1
+
+
+def test_parse_posA_batch():
+    payloads=['15RTgt0PAso;90TKcjM8h6g208CQ','13u?etPv2;0n:dDPwUM1U1Cb069D','13aEOK?P00PD2wVMdLDRhgvL289?']
+    cols=parse_posA_batch(payloads)
+    for i,payload in enumerate(payloads):
+        msg=parse_payload(payload)
+        assert cols["mmsi"][i]==msg.mmsi
+        assert cols["lon"][i]==msg.lon
+        assert cols["lat"][i]==msg.lat
+        assert cols["status"][i]==msg.status.value
+        if msg.heading is None:
+            assert math.isnan(cols["heading"][i])
+        else:
+            assert cols["heading"][i]==msg.heading
+
+
+def test_parse_aivdm_batch():
+    sentences=['!AIVDM,1,1,,A,15RTgt0PAso;90TKcjM8h6g208CQ,0',
+               '!AIVDM,2,1,5,B,55P5TL01VIaAL@7WKO@mBplU@<PDhh000000001S;AJ::4A80?4i@E53,0',
+               '!AIVDM,1,1,,B,13u?etPv2;0n:dDPwUM1U1Cb069D,0',
+               '!AIVDM,2,2,5,B,1@0000000000000,2',
+               '!AIVDM,1,1,,A,13aEOK?P00PD2wVMdLDRhgvL289?,0']
+    batches,singles=parse_aivdm_batch(sentences)
+    indexes,cols=batches[1]
+    assert list(indexes)==[0,2,4]
+    for i,index in enumerate(indexes):
+        msg=parse_aivdm(sentences[index])
+        assert cols["mmsi"][i]==msg.mmsi
+        assert cols["lat"][i]==msg.lat
+    assert len(singles)==1
+    assert singles[0][0]==3
+    assert singles[0][1].shipname=="MT.MITCHELL"
+
+
+def test_dearmor_batch_high_byte():
+    good='15RTgt0PAso;90TKcjM8h6g208CQ'
+    packed=dearmor_batch([good,'15RTgt0PAso;90\xe9KcjM8h6g208CQ',good.encode('ascii')],28)
+    assert (packed[0]==packed[2]).all()
+    assert (packed[0]==dearmor_batch([good],28)[0]).all()
+
+
+def test_aismsg_defaults():
+    class Color(Enum):
+        RED=1
+    class msg_defaults(Packet):
+        msgtype:int  =field(metadata=md(0, 6, u))
+        color  :Color=field(default=Color.RED,metadata={"record":False})
+    msg=aismsg(msg_defaults)(6,0b000101)
+    assert (msg.msgtype,msg.color)==(5,Color.RED)
+    class msg_missing(Packet):
+        msgtype:int  =field(metadata=md(0, 6, u))
+        tags   :list =field(default_factory=list,metadata={"record":False})
+    with pytest.raises(ValueError):
+        aismsg(msg_missing)
@@ -0,0 +1,78 @@
+"""
+
+"""
+import random
+from dataclasses import fields
+
+import numpy as np
+import pytest
+
+from packet.l1ca import L1CAMessage, get_multi_bits, read_msg_batch
+
+
+@pytest.mark.parametrize(
+    "parts,signed,expected",
+    [
+        ([( 1, 8)],False,0x8b),
+        ([( 1, 8)],True ,0x8b-0x100),
+        ([( 9,10)],True ,0),
+        ([(29,30),(31,32)],True ,-1),
+        ([(29,30),(31,32)],False,0b1111),
+    ]
+)
+def test_get_multi_bits(parts,signed,expected):
+    payload=[0x8b<<22|0b11,0b11<<28]+[0]*8
+    assert get_multi_bits(payload,parts,signed)==expected
+
+
+@pytest.mark.parametrize("subframe",[1,2,3,4,5])
+def test_parse_payload(subframe):
+    """
+    Generated parse_payload must agree with get_multi_bits() plus the scale for every field
+    """
+    rnd=random.Random(subframe)
+    for _ in range(100):
+        payload=[rnd.getrandbits(30) for _ in range(10)]
+        payload[1]=(payload[1]&~(0x7<<8))|(subframe<<8)
+        msg=L1CAMessage.read_msg(1,payload)
+        for field in fields(msg):
+            if 'parts' not in field.metadata:
+                continue
+            expected=get_multi_bits(payload,field.metadata['parts'],field.metadata.get('signed',False))
+            scale=field.metadata.get('scale',None)
+            if callable(scale):
+                expected=scale(expected)
+            elif scale is not None:
+                expected=scale*expected
+            assert getattr(msg,field.name)==expected
+
+
+def test_read_msg_batch():
+    """
+    Batch decoding must classify and decode the same as read_msg()
+    """
+    rnd=random.Random(0)
+    payloads=[]
+    for i in range(500):
+        payload=[rnd.getrandbits(30) for _ in range(10)]
+        payload[1]=(payload[1]&~(0x7<<8))|(rnd.randrange(8)<<8)
+        if i%2==0:
+            payload[2]=(payload[2]&~(0x3f<<22))|(rnd.choice([1,51,55,57,63])<<22)
+        payloads.append(payload)
+    seen=0
+    for cls,(idx,columns) in read_msg_batch(np.array(payloads,dtype=np.uint32)).items():
+        for j,i in enumerate(idx.tolist()):
+            msg=L1CAMessage.read_msg(1,payloads[i])
+            assert type(msg) is cls
+            for name,values in columns.items():
+                assert getattr(msg,name)==values[j]
+            seen+=1
+    assert seen==len(payloads)
+
+
+def test_read_msg_ndarray():
+    rnd=random.Random(1)
+    for subframe in range(8):
+        payload=[rnd.getrandbits(30) for _ in range(10)]
+        payload[1]=(payload[1]&~(0x7<<8))|(subframe<<8)
+        assert L1CAMessage.read_msg(1,np.array(payload,dtype=np.uint32))==L1CAMessage.read_msg(1,payload)
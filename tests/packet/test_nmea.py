@@ -0,0 +1,38 @@
+"""
+
+"""
+import pytest
+
+from packet.nmea import calc_checksum, split_nmea
+
+
+@pytest.mark.parametrize(
+    "data,expected",
+    [
+        ("GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,",0x47),
+        ("",0),
+        ("A",0x41),
+        ("AA",0),
+        ("PKWNE,1,2,3",0x50^0x4b^0x57^0x4e^0x45^0x2c^0x31^0x2c^0x32^0x2c^0x33),
+    ]
+)
+def test_calc_checksum(data,expected):
+    assert calc_checksum(data)==expected
+
+
+@pytest.mark.parametrize(
+    "line,expected",
+    [
+        ("$GPGGA,1,2*47\r\n",("GPGGA,1,2",0x47)),
+        ("12:00:00 $GPRMC,A*0f\n",("GPRMC,A",None)),
+        ("$junk$PKWNE,1*\n",("PKWNE,1",None)),
+        ("*4$GPWPL*4",("GPWPL",None)),
+        ("$A*ZZ$B*12",("B",0x12)),
+        ("$GPGGA,1*4A junk $GPRMC,2*3B\n",("GPRMC,2",0x3B)),
+        ("$GPGGA,1,2\n",None),
+        ("GPGGA*47\n",None),
+        ("\n",None),
+    ]
+)
+def test_split_nmea(line,expected):
+    assert split_nmea(line)==expected
@@ -0,0 +1,90 @@
+"""
+
+"""
+import io
+import random
+import struct
+from array import array
+from decimal import Decimal
+
+import pytest
+
+import packet.ublox
+from packet import Packet
+from packet.ublox import UBloxPacket, fletcher8, read_ublox_packet
+from packet.ublox.protocol_33_21 import GNSSID, QIND, UBX_ACK_ACK, UBX_ESF_MEAS, UBX_NAV_SAT
+
+
+@pytest.mark.parametrize("n",[0,1,63,64,65,1000,6+0xffff])
+def test_fletcher8(n):
+    rnd=random.Random(n)
+    buf=bytes(rnd.getrandbits(8) for _ in range(n))
+    ck_a=0
+    ck_b=0
+    for byte in buf:
+        ck_a=(ck_a+byte) & 0xFF
+        ck_b=(ck_b+ck_a) & 0xFF
+    assert fletcher8(buf)==bytes((ck_a,ck_b))
+    for split in (0,4,n//2,n):
+        assert fletcher8(buf[:split],buf[split:])==bytes((ck_a,ck_b))
+
+
+nav_sat_payload=(struct.pack('<IBBH',1000,1,2,0)+
+                 struct.pack('<BBBbhhI',0, 5,40,45,180,-12,(1<<3)|(2<<8)|(1<<11))+
+                 struct.pack('<BBBbhhI',6,17,30,-3, 90,  7,0b101))
+
+
+def test_parse_block():
+    msg=UBX_NAV_SAT(0x01,0x35,nav_sat_payload)
+    assert msg.iTOW==Decimal('1.000')
+    assert msg.numSvs==2
+    assert msg.svId==array('B',[5,17])
+    assert msg.elev==array('b',[45,-3])
+    assert msg.gnssId==[GNSSID.GPS,GNSSID.GLONASS]
+    assert msg.prRes==[Decimal('-1.2'),Decimal('0.7')]
+    assert msg.qualityInd==[QIND.NOSIG,QIND.CODE_CAR_SYNC5]
+    assert msg.svUsed==[True,False]
+    assert msg.orbitSource==[UBX_NAV_SAT.ORBSRC.ALMANAC,UBX_NAV_SAT.ORBSRC.NONE]
+    assert msg.ephAvail==[True,False]
+
+
+@pytest.mark.parametrize(
+    "pktcls,payload",
+    [
+        (UBX_NAV_SAT ,nav_sat_payload),
+        (UBX_NAV_SAT ,struct.pack('<IBBH',1000,1,0,0)),
+        (UBX_ESF_MEAS,struct.pack('<IHHIII',77,0b1101|(2<<11),3,(5<<24)|0xfffff0,(16<<24)|1234,4567)),
+    ]
+)
+def test_codegen(pktcls,payload):
+    """
+    Generated parse_payload and parent_values must agree with the general versions
+    """
+    msg=pktcls(0x00,0x00,payload)
+    ref=pktcls(0x00,0x00,payload)
+    UBloxPacket.parse_payload(ref,payload)
+    assert msg==ref
+    assert msg.parent_values()==Packet.parent_values(ref)
+
+
+def test_pool():
+    ack=UBX_ACK_ACK.acquire(0x05,0x01,bytes((0x01,0x07)))
+    ack.release()
+    again=UBX_ACK_ACK.acquire(0x05,0x01,bytes((0x06,0x8a)))
+    assert again is ack
+    assert (again.clsID_ack,again.msgId_ack)==(0x06,0x8a)
+    assert UBX_ACK_ACK.acquire(0x05,0x01,bytes((0x01,0x07))) is not ack
+    sat=UBX_NAV_SAT.acquire(0x01,0x35,nav_sat_payload)
+    sat.release()
+    assert UBX_NAV_SAT.acquire(0x01,0x35,nav_sat_payload) is not sat
+
+
+def test_verify_checksums(monkeypatch):
+    body=bytes((0x05,0x01,0x02,0x00,0x01,0x07))
+    ck=fletcher8(body)
+    bad=bytes((ck[0],ck[1]^0xff))
+    assert read_ublox_packet(b'\xb5',io.BytesIO(b'\x62'+body+bad)).msgId_ack==0x07
+    monkeypatch.setattr(packet.ublox,"VERIFY_CHECKSUMS",True)
+    assert read_ublox_packet(b'\xb5',io.BytesIO(b'\x62'+body+ck)).msgId_ack==0x07
+    with pytest.raises(ValueError):
+        read_ublox_packet(b'\xb5',io.BytesIO(b'\x62'+body+bad))
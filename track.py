@@ -12,5 +12,4 @@ class Track(dict):
                 lats_rad=[np.deg2rad(lat_deg) for lat_deg in lats_deg]
             if lons_rad is None:
                 lons_rad=[np.deg2rad(lon_deg) for lon_deg in lons_deg]
-            for time,lat_rad,lon_rad in zip(times,lats_rad,lons_rad):
-                self[time]=(lat_rad,lon_rad)
+            self.update(zip(times,zip(lats_rad,lons_rad)))